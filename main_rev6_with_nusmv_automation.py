@@ -1,126 +1,142 @@
 import os,subprocess
-
-
-def parse_board(board):
-    sokoban_pos = None
-    boxes = []
-    goals = []
-    walls = []
-
-    for r, row in enumerate(board):
-        for c, cell in enumerate(row):
-            if cell == '@' or cell == '+':
-                sokoban_pos = (c + 1, r + 1)  # +1 to convert to 1-based indexing
-            if cell == '$' or cell == '*':
-                boxes.append((c + 1, r + 1))
-            if cell == '.' or cell == '*' or cell == '+':
-                goals.append((c + 1, r + 1))
-            if cell == '#':
-                walls.append((c + 1, r + 1))
-
-    return sokoban_pos, boxes, goals, walls
-
-def generate_smv_model(board, sokoban_pos, boxes, goals, walls):
-    rows = len(board)
-    cols = len(board[0]) if rows > 0 else 0
-
-    smv_model = f"MODULE main\nVAR\n"
-    smv_model += f"    move : {{l,u,r,d}};\n"
-    smv_model += f"    man_c : 1..{cols};\n"
-    smv_model += f"    man_r : 1..{rows};\n"
+from smv_models import MOVE_STEPS, compile_board, dead_cells, generate_cell_smv_model, generate_push_smv_model, parse_board, smv_emitter, wall_ahead_cells
+
+
+@smv_emitter
+def generate_smv_model(board, sokoban_pos, boxes, goals, grid, const_walls=False, const_goals=False, move_ivar=False, cell_index=False, prune_dead=False, box_bitmap=False, occupancy=False, push_level=False, invar_spec=False, out=None):
+    if push_level:
+        # One transition per box push, see generate_push_smv_model
+        generate_push_smv_model(board, sokoban_pos, boxes, goals, grid, prune_dead=prune_dead, invar_spec=invar_spec, out=out)
+        return
+    if cell_index:
+        # Positions as numbered floor cells, see generate_cell_smv_model
+        generate_cell_smv_model(board, sokoban_pos, boxes, goals, grid, const_goals=const_goals, move_ivar=move_ivar, prune_dead=prune_dead, box_bitmap=box_bitmap, occupancy=occupancy, invar_spec=invar_spec, out=out)
+        return
+    if box_bitmap or occupancy:
+        # The coordinate model has neither, rather than silently ignore them
+        raise ValueError("box_bitmap and occupancy need cell_index=True")
+
+    rows = grid.rows
+    cols = grid.cols
+
+    out.write("MODULE main\n")
+    if move_ivar:
+        # The move is an input chosen at every step, not part of the state
+        out.write("IVAR\n")
+        out.write(f"    move : {{l,u,r,d}};\n")
+        out.write("VAR\n")
+    else:
+        out.write("VAR\n")
+        out.write(f"    move : {{l,u,r,d}};\n")
+    out.write(f"    man_c : 1..{cols};\n")
+    out.write(f"    man_r : 1..{rows};\n")
 
     for i, box in enumerate(boxes):
-        smv_model += f"    box_{i + 1}_c : 1..{cols};\n"
-        smv_model += f"    box_{i + 1}_r : 1..{rows};\n"
+        out.write(f"    box_{i + 1}_c : 1..{cols};\n")
+        out.write(f"    box_{i + 1}_r : 1..{rows};\n")
 
-    for i, goal in enumerate(goals):
-        smv_model += f"    goal_{i + 1}_c : 1..{cols};\n"
-        smv_model += f"    goal_{i + 1}_r : 1..{rows};\n"
+    if not const_goals:
+        for i, goal in enumerate(goals):
+            out.write(f"    goal_{i + 1}_c : 1..{cols};\n")
+            out.write(f"    goal_{i + 1}_r : 1..{rows};\n")
 
-    smv_model += f"    walls : array 1..{rows} of array 1..{cols} of 0..1;\n"
+    if not const_walls:
+        out.write(f"    walls : array 1..{rows} of array 1..{cols} of 0..1;\n")
 
-    smv_model += "ASSIGN\n"
-    smv_model += f"    init(man_c) := {sokoban_pos[0]};\n"
-    smv_model += f"    init(man_r) := {sokoban_pos[1]};\n"
+    out.write("ASSIGN\n")
+    out.write(f"    init(man_c) := {sokoban_pos[0]};\n")
+    out.write(f"    init(man_r) := {sokoban_pos[1]};\n")
 
     for i, box in enumerate(boxes):
-        smv_model += f"    init(box_{i + 1}_c) := {box[0]};\n"
-        smv_model += f"    init(box_{i + 1}_r) := {box[1]};\n"
-
-    for i, goal in enumerate(goals):
-        smv_model += f"    goal_{i + 1}_c := {goal[0]};\n"
-        smv_model += f"    goal_{i + 1}_r := {goal[1]};\n"
-
-    for r in range(1, rows + 1):
-        for c in range(1, cols + 1):
-            wall_value = 1 if (c, r) in walls else 0
-            smv_model += f"    walls[{r}][{c}] := {wall_value};\n"
-
-    smv_model += "next(man_c) :=\n"
-    smv_model += "    case\n"
-    smv_model += f"        move = r & (mv_r | push_r) & (man_c < {cols}) : man_c + 1;\n"
-    smv_model += f"        move = l & (mv_l | push_l) & (man_c > 1) : man_c - 1;\n"
-    smv_model += "        move = u : man_c;\n"
-    smv_model += "        move = d : man_c;\n"
-    smv_model += "        TRUE : man_c;\n"
-    smv_model += "    esac;\n"
-
-    smv_model += "next(man_r) :=\n"
-    smv_model += "    case\n"
-    smv_model += "        move = r : man_r;\n"
-    smv_model += "        move = l : man_r;\n"
-    smv_model += f"        move = u & (mv_u | push_u) & (man_r > 1) : man_r - 1;\n"
-    smv_model += f"        move = d & (mv_d | push_d) & (man_r < {rows}) : man_r + 1;\n"
-    smv_model += "        TRUE : man_r;\n"
-    smv_model += "    esac;\n"
-
-    for i in range(len(boxes)):
-        smv_model += f"next(box_{i + 1}_c) :=\n"
-        smv_model += "    case\n"
-        smv_model += f"        push_l & box_{i + 1}_on_l & (box_{i + 1}_c < {cols}) : box_{i + 1}_c - 1;\n"
-        smv_model += f"        push_r & box_{i + 1}_on_r & (box_{i + 1}_c > 1) : box_{i + 1}_c + 1;\n"
-        smv_model += f"        TRUE: box_{i+1}_c;\n"
-        smv_model += "    esac;\n"
-
-        smv_model += f"next(box_{i + 1}_r) :=\n"
-        smv_model += "    case\n"
-        smv_model += f"        push_u & box_{i + 1}_on_t & (box_{i + 1}_r > 1) : box_{i + 1}_r - 1;\n"
-        smv_model += f"        push_d & box_{i + 1}_on_b & (box_{i + 1}_r < {rows}) : box_{i + 1}_r + 1;\n"
-        smv_model += f"        TRUE: box_{i+1}_r;\n"
-        smv_model += "    esac;\n"
-
-    smv_model += "DEFINE\n"
-    # Define mv_* conditions
-    smv_model += f"    mv_r := (move = r) & (man_c < {cols}) & (walls[man_r][man_c + 1] = 0)"
-    for i in range(len(boxes)):
-        smv_model += f" & !box_{i+1}_on_r"
-    smv_model += ";\n"
+        out.write(f"    init(box_{i + 1}_c) := {box[0]};\n")
+        out.write(f"    init(box_{i + 1}_r) := {box[1]};\n")
+
+    if not const_goals:
+        for i, goal in enumerate(goals):
+            out.write(f"    goal_{i + 1}_c := {goal[0]};\n")
+            out.write(f"    goal_{i + 1}_r := {goal[1]};\n")
+
+    if not const_walls:
+        for r in range(1, rows + 1):
+            for c in range(1, cols + 1):
+                wall_value = 1 if grid.is_wall(c, r) else 0
+                out.write(f"    walls[{r}][{c}] := {wall_value};\n")
+
+    out.write("next(man_c) :=\n")
+    out.write("    case\n")
+    out.write(f"        move = r & (mv_r | push_r) & (man_c < {cols}) : man_c + 1;\n")
+    out.write(f"        move = l & (mv_l | push_l) & (man_c > 1) : man_c - 1;\n")
+    out.write("        move = u : man_c;\n")
+    out.write("        move = d : man_c;\n")
+    out.write("        TRUE : man_c;\n")
+    out.write("    esac;\n")
+
+    out.write("next(man_r) :=\n")
+    out.write("    case\n")
+    out.write("        move = r : man_r;\n")
+    out.write("        move = l : man_r;\n")
+    out.write(f"        move = u & (mv_u | push_u) & (man_r > 1) : man_r - 1;\n")
+    out.write(f"        move = d & (mv_d | push_d) & (man_r < {rows}) : man_r + 1;\n")
+    out.write("        TRUE : man_r;\n")
+    out.write("    esac;\n")
 
-    smv_model += f"    mv_l := (move = l) & (man_c > 1) & (walls[man_r][man_c - 1] = 0)"
     for i in range(len(boxes)):
-        smv_model += f" & !box_{i+1}_on_l"
-    smv_model += ";\n"
+        out.write(f"next(box_{i + 1}_c) :=\n")
+        out.write("    case\n")
+        out.write(f"        push_l & box_{i + 1}_on_l & (box_{i + 1}_c < {cols}) : box_{i + 1}_c - 1;\n")
+        out.write(f"        push_r & box_{i + 1}_on_r & (box_{i + 1}_c > 1) : box_{i + 1}_c + 1;\n")
+        out.write(f"        TRUE: box_{i+1}_c;\n")
+        out.write("    esac;\n")
+
+        out.write(f"next(box_{i + 1}_r) :=\n")
+        out.write("    case\n")
+        out.write(f"        push_u & box_{i + 1}_on_t & (box_{i + 1}_r > 1) : box_{i + 1}_r - 1;\n")
+        out.write(f"        push_d & box_{i + 1}_on_b & (box_{i + 1}_r < {rows}) : box_{i + 1}_r + 1;\n")
+        out.write(f"        TRUE: box_{i+1}_r;\n")
+        out.write("    esac;\n")
+
+    out.write("DEFINE\n")
+    if const_goals:
+        # Goals never move: define them as constants instead of pinned VARs
+        for i, goal in enumerate(goals):
+            out.write(f"    goal_{i + 1}_c := {goal[0]};\n")
+            out.write(f"    goal_{i + 1}_r := {goal[1]};\n")
+
+    if const_walls:
+        # Walls are compile-time constants: for every direction list the
+        # player cells that have a wall (or the board edge) one and two steps
+        # ahead instead of looking them up in a walls array
+        for move_dir, dc, dr, suffix in MOVE_STEPS:
+            for dist, name in ((1, f"wall_on_{suffix}"), (2, f"wall_on_{suffix}p1")):
+                cells = wall_ahead_cells(grid, dc, dr, dist)
+                terms = " | ".join(f"(man_c = {c} & man_r = {r})" for c, r in cells)
+                out.write(f"    {name} := {terms or 'FALSE'};\n")
+        mv_guards = {move_dir: f"!wall_on_{suffix}" for move_dir, _, _, suffix in MOVE_STEPS}
+    else:
+        mv_guards = {
+            'r': f"(man_c < {cols}) & (walls[man_r][man_c + 1] = 0)",
+            'l': "(man_c > 1) & (walls[man_r][man_c - 1] = 0)",
+            'u': "(man_r > 1) & (walls[man_r - 1][man_c] = 0)",
+            'd': f"(man_r < {rows}) & (walls[man_r + 1][man_c] = 0)"
+        }
 
-    smv_model += f"    mv_u := (move = u) & (man_r > 1) & (walls[man_r - 1][man_c] = 0)"
-    for i in range(len(boxes)):
-        smv_model += f" & !box_{i+1}_on_t"
-    smv_model += ";\n"
-
-    smv_model += f"    mv_d := (move = d) & (man_r < {rows}) & (walls[man_r + 1][man_c] = 0)"
-    for i in range(len(boxes)):
-        smv_model += f" & !box_{i+1}_on_b"
-    smv_model += ";\n"
+    # Define mv_* conditions
+    for move_dir, _, _, suffix in MOVE_STEPS:
+        out.write(f"    mv_{move_dir} := (move = {move_dir}) & {mv_guards[move_dir]}")
+        for i in range(len(boxes)):
+            out.write(f" & !box_{i+1}_on_{suffix}")
+        out.write(";\n")
 
     # Define box positions
     for i in range(len(boxes)):
-        smv_model += f"    box_{i + 1}_on_r := (man_c + 1 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_rp1 := (man_c + 2 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_l := (man_c - 1 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_lp1 := (man_c - 2 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_t := (man_c = box_{i + 1}_c) & (man_r - 1 = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_tp1 := (man_c = box_{i + 1}_c) & (man_r - 2 = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_b := (man_c = box_{i + 1}_c) & (man_r + 1 = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_bp1 := (man_c = box_{i + 1}_c) & (man_r + 2 = box_{i + 1}_r);\n"
+        out.write(f"    box_{i + 1}_on_r := (man_c + 1 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_rp1 := (man_c + 2 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_l := (man_c - 1 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_lp1 := (man_c - 2 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_t := (man_c = box_{i + 1}_c) & (man_r - 1 = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_tp1 := (man_c = box_{i + 1}_c) & (man_r - 2 = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_b := (man_c = box_{i + 1}_c) & (man_r + 1 = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_bp1 := (man_c = box_{i + 1}_c) & (man_r + 2 = box_{i + 1}_r);\n")
 
     # Define push conditions
     directions = [
@@ -130,262 +146,272 @@ def generate_smv_model(board, sokoban_pos, boxes, goals, walls):
         ('d', 'man_r + 2', 'on_b', 'on_bp1')
     ]
     for move_dir, wall_pos, on_suffix, next_suffix in directions:
-        smv_model += f"    push_{move_dir} := (move = {move_dir}) & (walls"
-        if move_dir in ['u', 'd']:
+        if const_walls:
+            out.write(f"    push_{move_dir} := (move = {move_dir}) & !wall_{next_suffix} & (")
+        elif move_dir in ['u', 'd']:
+            out.write(f"    push_{move_dir} := (move = {move_dir}) & (walls")
             wall_coord = f"man_r {'- 2' if move_dir == 'u' else '+ 2'}" if move_dir in ['u', 'd'] else f"man_c {'+ 2' if move_dir == 'r' else '- 2'}"
-            smv_model += f"[{wall_coord}][man_c] = 0) & ("
+            out.write(f"[{wall_coord}][man_c] = 0) & (")
         else:
+            out.write(f"    push_{move_dir} := (move = {move_dir}) & (walls")
             wall_coord = f"man_c {'+ 2' if move_dir == 'r' else '- 2'}" if move_dir in ['r', 'l'] else f"man_r {'- 2' if move_dir == 'u' else '+ 2'}"
-            smv_model += f"[man_r][{wall_coord}] = 0) & ("
+            out.write(f"[man_r][{wall_coord}] = 0) & (")
         for i in range(len(boxes)):
-            smv_model += f"(box_{i+1}_{on_suffix}"
+            out.write(f"(box_{i+1}_{on_suffix}")
             for j in range(len(boxes)):
                 if j != i:
-                    smv_model += f" & !box_{j+1}_{next_suffix}"
-            smv_model += ")"
+                    out.write(f" & !box_{j+1}_{next_suffix}")
+            out.write(")")
             if i < len(boxes) - 1:
-                smv_model += " | "
-        smv_model += ");\n"
+                out.write(" | ")
+        out.write(");\n")
 
     # Win condition
-    smv_model += "    win := "
+    out.write("    win := ")
     for i in range(len(boxes)):
-        smv_model += "("
+        out.write("(")
         for j in range(len(goals)):
-            smv_model += f"(box_{i+1}_c = goal_{j+1}_c & box_{i+1}_r = goal_{j+1}_r)"
+            out.write(f"(box_{i+1}_c = goal_{j+1}_c & box_{i+1}_r = goal_{j+1}_r)")
             if j < len(goals) - 1:
-                smv_model += " | "
-        smv_model += ")"
+                out.write(" | ")
+        out.write(")")
         if i < len(boxes) - 1:
-            smv_model += " & "
-    smv_model += ";\n"
-
-    smv_model += "LTLSPEC !F win;\n"
+            out.write(" & ")
+    out.write(";\n")
 
-    return smv_model
+    if prune_dead:
+        # A box that has to reach a goal may never enter a dead square
+        compiled = compile_board(grid, sokoban_pos, boxes)
+        dead = [compiled.cells[cell] for cell in dead_cells(compiled, goals)]
+        for i in range(len(boxes)):
+            if dead:
+                terms = " | ".join(f"(box_{i + 1}_c = {c} & box_{i + 1}_r = {r})" for c, r in dead)
+                out.write(f"INVAR !({terms});\n")
+    if invar_spec:
+        # Plain reachability for the invariant engines (no LTL loop-backs)
+        out.write("INVARSPEC !win;\n")
+    out.write("LTLSPEC !F win;\n")
 
 
-def generate_smv_model_old_2(board, sokoban_pos, boxes, goals, walls):
-    rows = len(board)
-    cols = len(board[0]) if rows > 0 else 0
+@smv_emitter
+def generate_smv_model_old_2(board, sokoban_pos, boxes, goals, grid, out=None):
+    rows = grid.rows
+    cols = grid.cols
 
-    smv_model = f"MODULE main\nVAR\n"
+    out.write("MODULE main\nVAR\n")
 
     # Variables for Sokoban position
-    smv_model += f"    man_c : 1..{cols};\n"
-    smv_model += f"    man_r : 1..{rows};\n"
+    out.write(f"    man_c : 1..{cols};\n")
+    out.write(f"    man_r : 1..{rows};\n")
 
     # Variables for boxes
     for i, box in enumerate(boxes):
-        smv_model += f"    box_{i + 1}_c : 1..{cols};\n"
-        smv_model += f"    box_{i + 1}_r : 1..{rows};\n"
+        out.write(f"    box_{i + 1}_c : 1..{cols};\n")
+        out.write(f"    box_{i + 1}_r : 1..{rows};\n")
 
     # Variables for goals
     for i, goal in enumerate(goals):
-        smv_model += f"    goal_{i + 1}_c : 1..{cols};\n"
-        smv_model += f"    goal_{i + 1}_r : 1..{rows};\n"
+        out.write(f"    goal_{i + 1}_c : 1..{cols};\n")
+        out.write(f"    goal_{i + 1}_r : 1..{rows};\n")
 
     # Walls as a 2D array
-    smv_model += f"    walls : array 1..{rows} of array 1..{cols} of 0..1;\n"
+    out.write(f"    walls : array 1..{rows} of array 1..{cols} of 0..1;\n")
 
     # Initial conditions
-    smv_model += "ASSIGN\n"
-    smv_model += f"    init(man_c) := {sokoban_pos[0]};\n"
-    smv_model += f"    init(man_r) := {sokoban_pos[1]};\n"
+    out.write("ASSIGN\n")
+    out.write(f"    init(man_c) := {sokoban_pos[0]};\n")
+    out.write(f"    init(man_r) := {sokoban_pos[1]};\n")
 
     for i, box in enumerate(boxes):
-        smv_model += f"    init(box_{i + 1}_c) := {box[0]};\n"
-        smv_model += f"    init(box_{i + 1}_r) := {box[1]};\n"
+        out.write(f"    init(box_{i + 1}_c) := {box[0]};\n")
+        out.write(f"    init(box_{i + 1}_r) := {box[1]};\n")
 
     for i, goal in enumerate(goals):
-        smv_model += f"    goal_{i + 1}_c := {goal[0]};\n"
-        smv_model += f"    goal_{i + 1}_r := {goal[1]};\n"
+        out.write(f"    goal_{i + 1}_c := {goal[0]};\n")
+        out.write(f"    goal_{i + 1}_r := {goal[1]};\n")
 
     # Initialize walls
     for r in range(1, rows + 1):
         for c in range(1, cols + 1):
-            wall_value = 1 if (c, r) in walls else 0
-            smv_model += f"    walls[{r}][{c}] := {wall_value};\n"
+            wall_value = 1 if grid.is_wall(c, r) else 0
+            out.write(f"    walls[{r}][{c}] := {wall_value};\n")
 
     # Transitions
-    smv_model += "next(man_c) :=\n"
-    smv_model += "    case\n"
-    smv_model += "        move = r & (mv_r | push_r) & (man_c < {cols}) : man_c + 1;\n"
-    smv_model += "        move = l & (mv_l | push_l) & (man_c > 1) : man_c - 1;\n"
-    smv_model += "        move = u : man_c;\n"
-    smv_model += "        move = d : man_c;\n"
-    smv_model += "        TRUE : man_c;\n"
-    smv_model += "    esac;\n"
-
-    smv_model += "next(man_r) :=\n"
-    smv_model += "    case\n"
-    smv_model += "        move = r : man_r;\n"
-    smv_model += "        move = l : man_r;\n"
-    smv_model += "        move = u & (mv_u | push_u) & (man_r > 1) : man_r - 1;\n"
-    smv_model += "        move = d & (mv_d | push_d) & (man_r < {rows}) : man_r + 1;\n"
-    smv_model += "        TRUE : man_r;\n"
-    smv_model += "    esac;\n"
+    out.write("next(man_c) :=\n")
+    out.write("    case\n")
+    out.write("        move = r & (mv_r | push_r) & (man_c < {cols}) : man_c + 1;\n")
+    out.write("        move = l & (mv_l | push_l) & (man_c > 1) : man_c - 1;\n")
+    out.write("        move = u : man_c;\n")
+    out.write("        move = d : man_c;\n")
+    out.write("        TRUE : man_c;\n")
+    out.write("    esac;\n")
+
+    out.write("next(man_r) :=\n")
+    out.write("    case\n")
+    out.write("        move = r : man_r;\n")
+    out.write("        move = l : man_r;\n")
+    out.write("        move = u & (mv_u | push_u) & (man_r > 1) : man_r - 1;\n")
+    out.write("        move = d & (mv_d | push_d) & (man_r < {rows}) : man_r + 1;\n")
+    out.write("        TRUE : man_r;\n")
+    out.write("    esac;\n")
 
     for i in range(len(boxes)):
-        smv_model += f"next(box_{i + 1}_c) :=\n"
-        smv_model += "    case\n"
-        smv_model += f"        push_l & (box_{i + 1}_c < {str(cols)}) : box_{i + 1}_c - 1;\n"
-        smv_model += f"        push_r & (box_{i + 1}_c > 1) : box_{i + 1}_c + 1;\n"
-        smv_model += "        TRUE: box_{i+1}_c;\n"
-        smv_model += "    esac;\n"
-
-        smv_model += f"next(box_{i + 1}_r) :=\n"
-        smv_model += "    case\n"
-        smv_model += f"        push_u & (box_{i + 1}_r > 1) : box_{i + 1}_r - 1;\n"
-        smv_model += f"        push_d & (box_{i + 1}_r < {str(rows)}) : box_{i + 1}_r + 1;\n"
-        smv_model += "        TRUE: box_{i+1}_r;\n"
-        smv_model += "    esac;\n"
+        out.write(f"next(box_{i + 1}_c) :=\n")
+        out.write("    case\n")
+        out.write(f"        push_l & (box_{i + 1}_c < {str(cols)}) : box_{i + 1}_c - 1;\n")
+        out.write(f"        push_r & (box_{i + 1}_c > 1) : box_{i + 1}_c + 1;\n")
+        out.write("        TRUE: box_{i+1}_c;\n")
+        out.write("    esac;\n")
+
+        out.write(f"next(box_{i + 1}_r) :=\n")
+        out.write("    case\n")
+        out.write(f"        push_u & (box_{i + 1}_r > 1) : box_{i + 1}_r - 1;\n")
+        out.write(f"        push_d & (box_{i + 1}_r < {str(rows)}) : box_{i + 1}_r + 1;\n")
+        out.write("        TRUE: box_{i+1}_r;\n")
+        out.write("    esac;\n")
 
     # Define conditions
-    smv_model += "DEFINE\n"
-    smv_model += "    mv_r := (move = r) & (man_c < {cols}) & (walls[man_r][man_c + 1] = 0) & !box_on_r;\n"
-    smv_model += "    mv_l := (move = l) & (man_c > 1) & (walls[man_r][man_c - 1] = 0) & !box_on_l;\n"
-    smv_model += "    mv_u := (move = u) & (man_r > 1) & (walls[man_r - 1][man_c] = 0) & !box_on_t;\n"
-    smv_model += "    mv_d := (move = d) & (man_r < {rows}) & (walls[man_r + 1][man_c] = 0) & !box_on_b;\n"
+    out.write("DEFINE\n")
+    out.write("    mv_r := (move = r) & (man_c < {cols}) & (walls[man_r][man_c + 1] = 0) & !box_on_r;\n")
+    out.write("    mv_l := (move = l) & (man_c > 1) & (walls[man_r][man_c - 1] = 0) & !box_on_l;\n")
+    out.write("    mv_u := (move = u) & (man_r > 1) & (walls[man_r - 1][man_c] = 0) & !box_on_t;\n")
+    out.write("    mv_d := (move = d) & (man_r < {rows}) & (walls[man_r + 1][man_c] = 0) & !box_on_b;\n")
 
     for i in range(len(boxes)):
-        smv_model += f"    box_{i + 1}_on_r := (man_c + 1 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_rp1 := (man_c + 2 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_l := (man_c - 1 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_lp1 := (man_c - 2 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_t := (man_c = box_{i + 1}_c) & (man_r - 1 = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_tp1 := (man_c = box_{i + 1}_c) & (man_r - 2 = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_b := (man_c = box_{i + 1}_c) & (man_r + 1 = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_bp1 := (man_c = box_{i + 1}_c) & (man_r + 2 = box_{i + 1}_r);\n"
+        out.write(f"    box_{i + 1}_on_r := (man_c + 1 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_rp1 := (man_c + 2 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_l := (man_c - 1 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_lp1 := (man_c - 2 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_t := (man_c = box_{i + 1}_c) & (man_r - 1 = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_tp1 := (man_c = box_{i + 1}_c) & (man_r - 2 = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_b := (man_c = box_{i + 1}_c) & (man_r + 1 = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_bp1 := (man_c = box_{i + 1}_c) & (man_r + 2 = box_{i + 1}_r);\n")
     for i in range(len(boxes)):
-        smv_model += "    push_r := (move = r) & (walls[man_r][man_c + 2] = 0) & !box_on_rp1 & box_on_r;\n"
-        smv_model += "    push_l := (move = l) & (walls[man_r][man_c - 2] = 0) & !box_on_lp1 & box_on_l;\n"
-        smv_model += "    push_u := (move = u) & (walls[man_r - 2][man_c] = 0) & !box_on_tp1 & box_on_t;\n"
-        smv_model += "    push_d := (move = d) & (walls[man_r + 2][man_c] = 0) & !box_on_bp1 & box_on_b;\n"
+        out.write("    push_r := (move = r) & (walls[man_r][man_c + 2] = 0) & !box_on_rp1 & box_on_r;\n")
+        out.write("    push_l := (move = l) & (walls[man_r][man_c - 2] = 0) & !box_on_lp1 & box_on_l;\n")
+        out.write("    push_u := (move = u) & (walls[man_r - 2][man_c] = 0) & !box_on_tp1 & box_on_t;\n")
+        out.write("    push_d := (move = d) & (walls[man_r + 2][man_c] = 0) & !box_on_bp1 & box_on_b;\n")
 
     # Winning condition: Any box on any goal
-    smv_model += "    win := "
+    out.write("    win := ")
     for i in range(len(boxes)):
         for j in range(len(goals)):
-            smv_model += f"(box_{i + 1}_c = goal_{j + 1}_c) & (box_{i + 1}_r = goal_{j + 1}_r)"
+            out.write(f"(box_{i + 1}_c = goal_{j + 1}_c) & (box_{i + 1}_r = goal_{j + 1}_r)")
             if i < len(boxes) - 1 or j < len(goals) - 1:
-                smv_model += " | "
-    smv_model += ";\n"
+                out.write(" | ")
+    out.write(";\n")
 
     # LTL specification
-    smv_model += "LTLSPEC !F win;\n"
+    out.write("LTLSPEC !F win;\n")
+@smv_emitter
+def generate_smv_model_old(board, sokoban_pos, boxes, goals, grid, out=None):
+    rows = grid.rows
+    cols = grid.cols
 
-    return smv_model
-def generate_smv_model_old(board, sokoban_pos, boxes, goals, walls):
-    rows = len(board)
-    cols = len(board[0]) if rows > 0 else 0
-
-    smv_model = f"MODULE main\nVAR\n"
+    out.write("MODULE main\nVAR\n")
 
     # Variables for Sokoban position
-    smv_model += f"    man_c : 1..{cols};\n"
-    smv_model += f"    man_r : 1..{rows};\n"
+    out.write(f"    man_c : 1..{cols};\n")
+    out.write(f"    man_r : 1..{rows};\n")
 
     # Variables for boxes
     for i, box in enumerate(boxes):
-        smv_model += f"    box_{i + 1}_c : 1..{cols};\n"
-        smv_model += f"    box_{i + 1}_r : 1..{rows};\n"
+        out.write(f"    box_{i + 1}_c : 1..{cols};\n")
+        out.write(f"    box_{i + 1}_r : 1..{rows};\n")
 
     # Variables for goals
     for i, goal in enumerate(goals):
-        smv_model += f"    goal_{i + 1}_c : 1..{cols};\n"
-        smv_model += f"    goal_{i + 1}_r : 1..{rows};\n"
+        out.write(f"    goal_{i + 1}_c : 1..{cols};\n")
+        out.write(f"    goal_{i + 1}_r : 1..{rows};\n")
 
     # Walls as a 2D array
-    smv_model += f"    walls : array 1..{rows} of array 1..{cols} of 0..1;\n"
+    out.write(f"    walls : array 1..{rows} of array 1..{cols} of 0..1;\n")
 
     # Initial conditions
-    smv_model += "ASSIGN\n"
-    smv_model += f"    init(man_c) := {sokoban_pos[0]};\n"
-    smv_model += f"    init(man_r) := {sokoban_pos[1]};\n"
+    out.write("ASSIGN\n")
+    out.write(f"    init(man_c) := {sokoban_pos[0]};\n")
+    out.write(f"    init(man_r) := {sokoban_pos[1]};\n")
 
     for i, box in enumerate(boxes):
-        smv_model += f"    init(box_{i + 1}_c) := {box[0]};\n"
-        smv_model += f"    init(box_{i + 1}_r) := {box[1]};\n"
+        out.write(f"    init(box_{i + 1}_c) := {box[0]};\n")
+        out.write(f"    init(box_{i + 1}_r) := {box[1]};\n")
 
     for i, goal in enumerate(goals):
-        smv_model += f"    goal_{i + 1}_c := {goal[0]};\n"
-        smv_model += f"    goal_{i + 1}_r := {goal[1]};\n"
+        out.write(f"    goal_{i + 1}_c := {goal[0]};\n")
+        out.write(f"    goal_{i + 1}_r := {goal[1]};\n")
 
     # Initialize walls
     for r in range(1, rows + 1):
         for c in range(1, cols + 1):
-            wall_value = 1 if (c, r) in walls else 0
-            smv_model += f"    walls[{r}][{c}] := {wall_value};\n"
+            wall_value = 1 if grid.is_wall(c, r) else 0
+            out.write(f"    walls[{r}][{c}] := {wall_value};\n")
 
     # Transitions
-    smv_model += "next(man_c) :=\n"
-    smv_model += "    case\n"
-    smv_model += "        move = r & (mv_r | push_r) & (man_c < {cols}) : man_c + 1;\n"
-    smv_model += "        move = l & (mv_l | push_l) & (man_c > 1) : man_c - 1;\n"
-    smv_model += "        move = u : man_c;\n"
-    smv_model += "        move = d : man_c;\n"
-    smv_model += "        TRUE : man_c;\n"
-    smv_model += "    esac;\n"
-
-    smv_model += "next(man_r) :=\n"
-    smv_model += "    case\n"
-    smv_model += "        move = r : man_r;\n"
-    smv_model += "        move = l : man_r;\n"
-    smv_model += "        move = u & (mv_u | push_u) & (man_r > 1) : man_r - 1;\n"
-    smv_model += "        move = d & (mv_d | push_d) & (man_r < {rows}) : man_r + 1;\n"
-    smv_model += "        TRUE : man_r;\n"
-    smv_model += "    esac;\n"
+    out.write("next(man_c) :=\n")
+    out.write("    case\n")
+    out.write("        move = r & (mv_r | push_r) & (man_c < {cols}) : man_c + 1;\n")
+    out.write("        move = l & (mv_l | push_l) & (man_c > 1) : man_c - 1;\n")
+    out.write("        move = u : man_c;\n")
+    out.write("        move = d : man_c;\n")
+    out.write("        TRUE : man_c;\n")
+    out.write("    esac;\n")
+
+    out.write("next(man_r) :=\n")
+    out.write("    case\n")
+    out.write("        move = r : man_r;\n")
+    out.write("        move = l : man_r;\n")
+    out.write("        move = u & (mv_u | push_u) & (man_r > 1) : man_r - 1;\n")
+    out.write("        move = d & (mv_d | push_d) & (man_r < {rows}) : man_r + 1;\n")
+    out.write("        TRUE : man_r;\n")
+    out.write("    esac;\n")
 
     for i in range(len(boxes)):
-        smv_model += f"next(box_{i + 1}_c) :=\n"
-        smv_model += "    case\n"
-        smv_model += f"        push_l & (box_{i + 1}_c < {str(cols)}) : box_{i + 1}_c - 1;\n"
-        smv_model += f"        push_r & (box_{i + 1}_c > 1) : box_{i + 1}_c + 1;\n"
-        smv_model += "        TRUE: box_{i+1}_c;\n"
-        smv_model += "    esac;\n"
-
-        smv_model += f"next(box_{i + 1}_r) :=\n"
-        smv_model += "    case\n"
-        smv_model += f"        push_u & (box_{i + 1}_r > 1) : box_{i + 1}_r - 1;\n"
-        smv_model += f"        push_d & (box_{i + 1}_r < {str(rows)}) : box_{i + 1}_r + 1;\n"
-        smv_model += "        TRUE: box_{i+1}_r;\n"
-        smv_model += "    esac;\n"
+        out.write(f"next(box_{i + 1}_c) :=\n")
+        out.write("    case\n")
+        out.write(f"        push_l & (box_{i + 1}_c < {str(cols)}) : box_{i + 1}_c - 1;\n")
+        out.write(f"        push_r & (box_{i + 1}_c > 1) : box_{i + 1}_c + 1;\n")
+        out.write("        TRUE: box_{i+1}_c;\n")
+        out.write("    esac;\n")
+
+        out.write(f"next(box_{i + 1}_r) :=\n")
+        out.write("    case\n")
+        out.write(f"        push_u & (box_{i + 1}_r > 1) : box_{i + 1}_r - 1;\n")
+        out.write(f"        push_d & (box_{i + 1}_r < {str(rows)}) : box_{i + 1}_r + 1;\n")
+        out.write("        TRUE: box_{i+1}_r;\n")
+        out.write("    esac;\n")
 
     # Define conditions
-    smv_model += "DEFINE\n"
-    smv_model += "    mv_r := (move = r) & (man_c < {cols}) & (walls[man_r][man_c + 1] = 0) & !box_on_r;\n"
-    smv_model += "    mv_l := (move = l) & (man_c > 1) & (walls[man_r][man_c - 1] = 0) & !box_on_l;\n"
-    smv_model += "    mv_u := (move = u) & (man_r > 1) & (walls[man_r - 1][man_c] = 0) & !box_on_t;\n"
-    smv_model += "    mv_d := (move = d) & (man_r < {rows}) & (walls[man_r + 1][man_c] = 0) & !box_on_b;\n"
+    out.write("DEFINE\n")
+    out.write("    mv_r := (move = r) & (man_c < {cols}) & (walls[man_r][man_c + 1] = 0) & !box_on_r;\n")
+    out.write("    mv_l := (move = l) & (man_c > 1) & (walls[man_r][man_c - 1] = 0) & !box_on_l;\n")
+    out.write("    mv_u := (move = u) & (man_r > 1) & (walls[man_r - 1][man_c] = 0) & !box_on_t;\n")
+    out.write("    mv_d := (move = d) & (man_r < {rows}) & (walls[man_r + 1][man_c] = 0) & !box_on_b;\n")
 
     for i in range(len(boxes)):
-        smv_model += f"    box_{i + 1}_on_r := (man_c + 1 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_rp1 := (man_c + 2 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_l := (man_c - 1 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_lp1 := (man_c - 2 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_t := (man_c = box_{i + 1}_c) & (man_r - 1 = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_tp1 := (man_c = box_{i + 1}_c) & (man_r - 2 = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_b := (man_c = box_{i + 1}_c) & (man_r + 1 = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_bp1 := (man_c = box_{i + 1}_c) & (man_r + 2 = box_{i + 1}_r);\n"
+        out.write(f"    box_{i + 1}_on_r := (man_c + 1 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_rp1 := (man_c + 2 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_l := (man_c - 1 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_lp1 := (man_c - 2 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_t := (man_c = box_{i + 1}_c) & (man_r - 1 = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_tp1 := (man_c = box_{i + 1}_c) & (man_r - 2 = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_b := (man_c = box_{i + 1}_c) & (man_r + 1 = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_bp1 := (man_c = box_{i + 1}_c) & (man_r + 2 = box_{i + 1}_r);\n")
     for i in range(len(boxes)):
-        smv_model += "    push_r := (move = r) & (walls[man_r][man_c + 2] = 0) & !box_on_rp1 & box_on_r;\n"
-        smv_model += "    push_l := (move = l) & (walls[man_r][man_c - 2] = 0) & !box_on_lp1 & box_on_l;\n"
-        smv_model += "    push_u := (move = u) & (walls[man_r - 2][man_c] = 0) & !box_on_tp1 & box_on_t;\n"
-        smv_model += "    push_d := (move = d) & (walls[man_r + 2][man_c] = 0) & !box_on_bp1 & box_on_b;\n"
+        out.write("    push_r := (move = r) & (walls[man_r][man_c + 2] = 0) & !box_on_rp1 & box_on_r;\n")
+        out.write("    push_l := (move = l) & (walls[man_r][man_c - 2] = 0) & !box_on_lp1 & box_on_l;\n")
+        out.write("    push_u := (move = u) & (walls[man_r - 2][man_c] = 0) & !box_on_tp1 & box_on_t;\n")
+        out.write("    push_d := (move = d) & (walls[man_r + 2][man_c] = 0) & !box_on_bp1 & box_on_b;\n")
 
     # Winning condition
-    smv_model += "    win := "
+    out.write("    win := ")
     for i in range(len(boxes)):
-        smv_model += f"(box_{i + 1}_c = goal_{i + 1}_c) & (box_{i + 1}_r = goal_{i + 1}_r)"
+        out.write(f"(box_{i + 1}_c = goal_{i + 1}_c) & (box_{i + 1}_r = goal_{i + 1}_r)")
         if i < len(boxes) - 1:
-            smv_model += " & "
-    smv_model += ";\n"
+            out.write(" & ")
+    out.write(";\n")
 
     # LTL specification
-    smv_model += "LTLSPEC !F win;\n"
-
-    return smv_model
+    out.write("LTLSPEC !F win;\n")
 import subprocess
 
 def run_nusmv_and_check(filename,bound=20):
@@ -436,18 +462,16 @@ def run_nusmv_and_check(filename,bound=20):
         print("Error: NuSMV process timed out.")
 
 
-def run_skoban(out_dir, boards):
+def run_skoban(out_dir, boards, model_options=None):
     os.makedirs(out_dir, exist_ok=True)
 
     for idx, board in enumerate(boards, start=1):
         print(f"\n=== Processing board #{idx} ===")
         try:
-            sokoban_pos, boxes, goals, walls = parse_board(board)
-            smv = generate_smv_model(board, sokoban_pos, boxes, goals, walls)
-
+            sokoban_pos, boxes, goals, grid = parse_board(board)
             fname = os.path.join(out_dir, f"sokoban_{idx}.smv")
             with open(fname, "w") as f:
-                f.write(smv)
+                generate_smv_model(board, sokoban_pos, boxes, goals, grid, out=f, **(model_options or {}))
 
             winnable = run_nusmv_and_check(fname)
             print(f"--> Board {idx} is {'winnable' if winnable else 'NOT winnable'}")
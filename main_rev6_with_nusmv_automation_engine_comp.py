@@ -1,126 +1,146 @@
-import os,subprocess,time, re
-
-
-def parse_board(board):
-    sokoban_pos = None
-    boxes = []
-    goals = []
-    walls = []
-
-    for r, row in enumerate(board):
-        for c, cell in enumerate(row):
-            if cell == '@' or cell == '+':
-                sokoban_pos = (c + 1, r + 1)  # +1 to convert to 1-based indexing
-            if cell == '$' or cell == '*':
-                boxes.append((c + 1, r + 1))
-            if cell == '.' or cell == '*' or cell == '+':
-                goals.append((c + 1, r + 1))
-            if cell == '#':
-                walls.append((c + 1, r + 1))
-
-    return sokoban_pos, boxes, goals, walls
-
-def generate_smv_model(board, sokoban_pos, boxes, goals, walls):
-    rows = len(board)
-    cols = len(board[0]) if rows > 0 else 0
-
-    smv_model = f"MODULE main\nVAR\n"
-    smv_model += f"    move : {{l,u,r,d}};\n"
-    smv_model += f"    man_c : 1..{cols};\n"
-    smv_model += f"    man_r : 1..{rows};\n"
+import concurrent.futures,os
+from nusmv_session import SessionPool
+from result_cache import ResultCache
+from native_solver import SOLVERS, benchmark_transpositions
+from smv_models import MOVE_STEPS, compile_board, dead_cells, generate_cell_smv_model, generate_push_smv_model, parse_board, smv_emitter, wall_ahead_cells
+from smv_runner import NATIVE_PREFILTER_NODES, PROVED_UNSOLVABLE, UNKNOWN, cached_run, run_bound_escalation, run_nusmv_and_check, run_portfolio
+
+
+@smv_emitter
+def generate_smv_model(board, sokoban_pos, boxes, goals, grid, const_walls=False, const_goals=False, move_ivar=False, cell_index=False, prune_dead=False, box_bitmap=False, occupancy=False, push_level=False, invar_spec=False, out=None):
+    if push_level:
+        # One transition per box push, see generate_push_smv_model
+        generate_push_smv_model(board, sokoban_pos, boxes, goals, grid, prune_dead=prune_dead, invar_spec=invar_spec, out=out)
+        return
+    if cell_index:
+        # Positions as numbered floor cells, see generate_cell_smv_model
+        generate_cell_smv_model(board, sokoban_pos, boxes, goals, grid, const_goals=const_goals, move_ivar=move_ivar, prune_dead=prune_dead, box_bitmap=box_bitmap, occupancy=occupancy, invar_spec=invar_spec, out=out)
+        return
+    if box_bitmap or occupancy:
+        # The coordinate model has neither, rather than silently ignore them
+        raise ValueError("box_bitmap and occupancy need cell_index=True")
+
+    rows = grid.rows
+    cols = grid.cols
+
+    out.write("MODULE main\n")
+    if move_ivar:
+        # The move is an input chosen at every step, not part of the state
+        out.write("IVAR\n")
+        out.write(f"    move : {{l,u,r,d}};\n")
+        out.write("VAR\n")
+    else:
+        out.write("VAR\n")
+        out.write(f"    move : {{l,u,r,d}};\n")
+    out.write(f"    man_c : 1..{cols};\n")
+    out.write(f"    man_r : 1..{rows};\n")
 
     for i, box in enumerate(boxes):
-        smv_model += f"    box_{i + 1}_c : 1..{cols};\n"
-        smv_model += f"    box_{i + 1}_r : 1..{rows};\n"
+        out.write(f"    box_{i + 1}_c : 1..{cols};\n")
+        out.write(f"    box_{i + 1}_r : 1..{rows};\n")
 
-    for i, goal in enumerate(goals):
-        smv_model += f"    goal_{i + 1}_c : 1..{cols};\n"
-        smv_model += f"    goal_{i + 1}_r : 1..{rows};\n"
+    if not const_goals:
+        for i, goal in enumerate(goals):
+            out.write(f"    goal_{i + 1}_c : 1..{cols};\n")
+            out.write(f"    goal_{i + 1}_r : 1..{rows};\n")
 
-    smv_model += f"    walls : array 1..{rows} of array 1..{cols} of 0..1;\n"
+    if not const_walls:
+        out.write(f"    walls : array 1..{rows} of array 1..{cols} of 0..1;\n")
 
-    smv_model += "ASSIGN\n"
-    smv_model += f"    init(man_c) := {sokoban_pos[0]};\n"
-    smv_model += f"    init(man_r) := {sokoban_pos[1]};\n"
+    out.write("ASSIGN\n")
+    out.write(f"    init(man_c) := {sokoban_pos[0]};\n")
+    out.write(f"    init(man_r) := {sokoban_pos[1]};\n")
 
     for i, box in enumerate(boxes):
-        smv_model += f"    init(box_{i + 1}_c) := {box[0]};\n"
-        smv_model += f"    init(box_{i + 1}_r) := {box[1]};\n"
-
-    for i, goal in enumerate(goals):
-        smv_model += f"    goal_{i + 1}_c := {goal[0]};\n"
-        smv_model += f"    goal_{i + 1}_r := {goal[1]};\n"
-
-    for r in range(1, rows + 1):
-        for c in range(1, cols + 1):
-            wall_value = 1 if (c, r) in walls else 0
-            smv_model += f"    walls[{r}][{c}] := {wall_value};\n"
-
-    smv_model += "next(man_c) :=\n"
-    smv_model += "    case\n"
-    smv_model += f"        move = r & (mv_r | push_r) & (man_c < {cols}) : man_c + 1;\n"
-    smv_model += f"        move = l & (mv_l | push_l) & (man_c > 1) : man_c - 1;\n"
-    smv_model += "        move = u : man_c;\n"
-    smv_model += "        move = d : man_c;\n"
-    smv_model += "        TRUE : man_c;\n"
-    smv_model += "    esac;\n"
-
-    smv_model += "next(man_r) :=\n"
-    smv_model += "    case\n"
-    smv_model += "        move = r : man_r;\n"
-    smv_model += "        move = l : man_r;\n"
-    smv_model += f"        move = u & (mv_u | push_u) & (man_r > 1) : man_r - 1;\n"
-    smv_model += f"        move = d & (mv_d | push_d) & (man_r < {rows}) : man_r + 1;\n"
-    smv_model += "        TRUE : man_r;\n"
-    smv_model += "    esac;\n"
-
-    for i in range(len(boxes)):
-        smv_model += f"next(box_{i + 1}_c) :=\n"
-        smv_model += "    case\n"
-        smv_model += f"        push_l & box_{i + 1}_on_l & (box_{i + 1}_c < {cols}) : box_{i + 1}_c - 1;\n"
-        smv_model += f"        push_r & box_{i + 1}_on_r & (box_{i + 1}_c > 1) : box_{i + 1}_c + 1;\n"
-        smv_model += f"        TRUE: box_{i+1}_c;\n"
-        smv_model += "    esac;\n"
-
-        smv_model += f"next(box_{i + 1}_r) :=\n"
-        smv_model += "    case\n"
-        smv_model += f"        push_u & box_{i + 1}_on_t & (box_{i + 1}_r > 1) : box_{i + 1}_r - 1;\n"
-        smv_model += f"        push_d & box_{i + 1}_on_b & (box_{i + 1}_r < {rows}) : box_{i + 1}_r + 1;\n"
-        smv_model += f"        TRUE: box_{i+1}_r;\n"
-        smv_model += "    esac;\n"
-
-    smv_model += "DEFINE\n"
-    # Define mv_* conditions
-    smv_model += f"    mv_r := (move = r) & (man_c < {cols}) & (walls[man_r][man_c + 1] = 0)"
-    for i in range(len(boxes)):
-        smv_model += f" & !box_{i+1}_on_r"
-    smv_model += ";\n"
-
-    smv_model += f"    mv_l := (move = l) & (man_c > 1) & (walls[man_r][man_c - 1] = 0)"
-    for i in range(len(boxes)):
-        smv_model += f" & !box_{i+1}_on_l"
-    smv_model += ";\n"
+        out.write(f"    init(box_{i + 1}_c) := {box[0]};\n")
+        out.write(f"    init(box_{i + 1}_r) := {box[1]};\n")
+
+    if not const_goals:
+        for i, goal in enumerate(goals):
+            out.write(f"    goal_{i + 1}_c := {goal[0]};\n")
+            out.write(f"    goal_{i + 1}_r := {goal[1]};\n")
+
+    if not const_walls:
+        for r in range(1, rows + 1):
+            for c in range(1, cols + 1):
+                wall_value = 1 if grid.is_wall(c, r) else 0
+                out.write(f"    walls[{r}][{c}] := {wall_value};\n")
+
+    out.write("next(man_c) :=\n")
+    out.write("    case\n")
+    out.write(f"        move = r & (mv_r | push_r) & (man_c < {cols}) : man_c + 1;\n")
+    out.write(f"        move = l & (mv_l | push_l) & (man_c > 1) : man_c - 1;\n")
+    out.write("        move = u : man_c;\n")
+    out.write("        move = d : man_c;\n")
+    out.write("        TRUE : man_c;\n")
+    out.write("    esac;\n")
+
+    out.write("next(man_r) :=\n")
+    out.write("    case\n")
+    out.write("        move = r : man_r;\n")
+    out.write("        move = l : man_r;\n")
+    out.write(f"        move = u & (mv_u | push_u) & (man_r > 1) : man_r - 1;\n")
+    out.write(f"        move = d & (mv_d | push_d) & (man_r < {rows}) : man_r + 1;\n")
+    out.write("        TRUE : man_r;\n")
+    out.write("    esac;\n")
 
-    smv_model += f"    mv_u := (move = u) & (man_r > 1) & (walls[man_r - 1][man_c] = 0)"
     for i in range(len(boxes)):
-        smv_model += f" & !box_{i+1}_on_t"
-    smv_model += ";\n"
+        out.write(f"next(box_{i + 1}_c) :=\n")
+        out.write("    case\n")
+        out.write(f"        push_l & box_{i + 1}_on_l & (box_{i + 1}_c < {cols}) : box_{i + 1}_c - 1;\n")
+        out.write(f"        push_r & box_{i + 1}_on_r & (box_{i + 1}_c > 1) : box_{i + 1}_c + 1;\n")
+        out.write(f"        TRUE: box_{i+1}_c;\n")
+        out.write("    esac;\n")
+
+        out.write(f"next(box_{i + 1}_r) :=\n")
+        out.write("    case\n")
+        out.write(f"        push_u & box_{i + 1}_on_t & (box_{i + 1}_r > 1) : box_{i + 1}_r - 1;\n")
+        out.write(f"        push_d & box_{i + 1}_on_b & (box_{i + 1}_r < {rows}) : box_{i + 1}_r + 1;\n")
+        out.write(f"        TRUE: box_{i+1}_r;\n")
+        out.write("    esac;\n")
+
+    out.write("DEFINE\n")
+    if const_goals:
+        # Goals never move: define them as constants instead of pinned VARs
+        for i, goal in enumerate(goals):
+            out.write(f"    goal_{i + 1}_c := {goal[0]};\n")
+            out.write(f"    goal_{i + 1}_r := {goal[1]};\n")
+
+    if const_walls:
+        # Walls are compile-time constants: for every direction list the
+        # player cells that have a wall (or the board edge) one and two steps
+        # ahead instead of looking them up in a walls array
+        for move_dir, dc, dr, suffix in MOVE_STEPS:
+            for dist, name in ((1, f"wall_on_{suffix}"), (2, f"wall_on_{suffix}p1")):
+                cells = wall_ahead_cells(grid, dc, dr, dist)
+                terms = " | ".join(f"(man_c = {c} & man_r = {r})" for c, r in cells)
+                out.write(f"    {name} := {terms or 'FALSE'};\n")
+        mv_guards = {move_dir: f"!wall_on_{suffix}" for move_dir, _, _, suffix in MOVE_STEPS}
+    else:
+        mv_guards = {
+            'r': f"(man_c < {cols}) & (walls[man_r][man_c + 1] = 0)",
+            'l': "(man_c > 1) & (walls[man_r][man_c - 1] = 0)",
+            'u': "(man_r > 1) & (walls[man_r - 1][man_c] = 0)",
+            'd': f"(man_r < {rows}) & (walls[man_r + 1][man_c] = 0)"
+        }
 
-    smv_model += f"    mv_d := (move = d) & (man_r < {rows}) & (walls[man_r + 1][man_c] = 0)"
-    for i in range(len(boxes)):
-        smv_model += f" & !box_{i+1}_on_b"
-    smv_model += ";\n"
+    # Define mv_* conditions
+    for move_dir, _, _, suffix in MOVE_STEPS:
+        out.write(f"    mv_{move_dir} := (move = {move_dir}) & {mv_guards[move_dir]}")
+        for i in range(len(boxes)):
+            out.write(f" & !box_{i+1}_on_{suffix}")
+        out.write(";\n")
 
     # Define box positions
     for i in range(len(boxes)):
-        smv_model += f"    box_{i + 1}_on_r := (man_c + 1 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_rp1 := (man_c + 2 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_l := (man_c - 1 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_lp1 := (man_c - 2 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_t := (man_c = box_{i + 1}_c) & (man_r - 1 = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_tp1 := (man_c = box_{i + 1}_c) & (man_r - 2 = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_b := (man_c = box_{i + 1}_c) & (man_r + 1 = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_bp1 := (man_c = box_{i + 1}_c) & (man_r + 2 = box_{i + 1}_r);\n"
+        out.write(f"    box_{i + 1}_on_r := (man_c + 1 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_rp1 := (man_c + 2 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_l := (man_c - 1 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_lp1 := (man_c - 2 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_t := (man_c = box_{i + 1}_c) & (man_r - 1 = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_tp1 := (man_c = box_{i + 1}_c) & (man_r - 2 = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_b := (man_c = box_{i + 1}_c) & (man_r + 1 = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_bp1 := (man_c = box_{i + 1}_c) & (man_r + 2 = box_{i + 1}_r);\n")
 
     # Define push conditions
     directions = [
@@ -130,378 +150,391 @@ def generate_smv_model(board, sokoban_pos, boxes, goals, walls):
         ('d', 'man_r + 2', 'on_b', 'on_bp1')
     ]
     for move_dir, wall_pos, on_suffix, next_suffix in directions:
-        smv_model += f"    push_{move_dir} := (move = {move_dir}) & (walls"
-        if move_dir in ['u', 'd']:
+        if const_walls:
+            out.write(f"    push_{move_dir} := (move = {move_dir}) & !wall_{next_suffix} & (")
+        elif move_dir in ['u', 'd']:
+            out.write(f"    push_{move_dir} := (move = {move_dir}) & (walls")
             wall_coord = f"man_r {'- 2' if move_dir == 'u' else '+ 2'}" if move_dir in ['u', 'd'] else f"man_c {'+ 2' if move_dir == 'r' else '- 2'}"
-            smv_model += f"[{wall_coord}][man_c] = 0) & ("
+            out.write(f"[{wall_coord}][man_c] = 0) & (")
         else:
+            out.write(f"    push_{move_dir} := (move = {move_dir}) & (walls")
             wall_coord = f"man_c {'+ 2' if move_dir == 'r' else '- 2'}" if move_dir in ['r', 'l'] else f"man_r {'- 2' if move_dir == 'u' else '+ 2'}"
-            smv_model += f"[man_r][{wall_coord}] = 0) & ("
+            out.write(f"[man_r][{wall_coord}] = 0) & (")
         for i in range(len(boxes)):
-            smv_model += f"(box_{i+1}_{on_suffix}"
+            out.write(f"(box_{i+1}_{on_suffix}")
             for j in range(len(boxes)):
                 if j != i:
-                    smv_model += f" & !box_{j+1}_{next_suffix}"
-            smv_model += ")"
+                    out.write(f" & !box_{j+1}_{next_suffix}")
+            out.write(")")
             if i < len(boxes) - 1:
-                smv_model += " | "
-        smv_model += ");\n"
+                out.write(" | ")
+        out.write(");\n")
 
     # Win condition
-    smv_model += "    win := "
+    out.write("    win := ")
     for i in range(len(boxes)):
-        smv_model += "("
+        out.write("(")
         for j in range(len(goals)):
-            smv_model += f"(box_{i+1}_c = goal_{j+1}_c & box_{i+1}_r = goal_{j+1}_r)"
+            out.write(f"(box_{i+1}_c = goal_{j+1}_c & box_{i+1}_r = goal_{j+1}_r)")
             if j < len(goals) - 1:
-                smv_model += " | "
-        smv_model += ")"
+                out.write(" | ")
+        out.write(")")
         if i < len(boxes) - 1:
-            smv_model += " & "
-    smv_model += ";\n"
-
-    smv_model += "LTLSPEC !F win;\n"
+            out.write(" & ")
+    out.write(";\n")
 
-    return smv_model
+    if prune_dead:
+        # A box that has to reach a goal may never enter a dead square
+        compiled = compile_board(grid, sokoban_pos, boxes)
+        dead = [compiled.cells[cell] for cell in dead_cells(compiled, goals)]
+        for i in range(len(boxes)):
+            if dead:
+                terms = " | ".join(f"(box_{i + 1}_c = {c} & box_{i + 1}_r = {r})" for c, r in dead)
+                out.write(f"INVAR !({terms});\n")
+    if invar_spec:
+        # Plain reachability for the invariant engines (no LTL loop-backs)
+        out.write("INVARSPEC !win;\n")
+    out.write("LTLSPEC !F win;\n")
 
 
-def generate_smv_model_old_2(board, sokoban_pos, boxes, goals, walls):
-    rows = len(board)
-    cols = len(board[0]) if rows > 0 else 0
+@smv_emitter
+def generate_smv_model_old_2(board, sokoban_pos, boxes, goals, grid, out=None):
+    rows = grid.rows
+    cols = grid.cols
 
-    smv_model = f"MODULE main\nVAR\n"
+    out.write("MODULE main\nVAR\n")
 
     # Variables for Sokoban position
-    smv_model += f"    man_c : 1..{cols};\n"
-    smv_model += f"    man_r : 1..{rows};\n"
+    out.write(f"    man_c : 1..{cols};\n")
+    out.write(f"    man_r : 1..{rows};\n")
 
     # Variables for boxes
     for i, box in enumerate(boxes):
-        smv_model += f"    box_{i + 1}_c : 1..{cols};\n"
-        smv_model += f"    box_{i + 1}_r : 1..{rows};\n"
+        out.write(f"    box_{i + 1}_c : 1..{cols};\n")
+        out.write(f"    box_{i + 1}_r : 1..{rows};\n")
 
     # Variables for goals
     for i, goal in enumerate(goals):
-        smv_model += f"    goal_{i + 1}_c : 1..{cols};\n"
-        smv_model += f"    goal_{i + 1}_r : 1..{rows};\n"
+        out.write(f"    goal_{i + 1}_c : 1..{cols};\n")
+        out.write(f"    goal_{i + 1}_r : 1..{rows};\n")
 
     # Walls as a 2D array
-    smv_model += f"    walls : array 1..{rows} of array 1..{cols} of 0..1;\n"
+    out.write(f"    walls : array 1..{rows} of array 1..{cols} of 0..1;\n")
 
     # Initial conditions
-    smv_model += "ASSIGN\n"
-    smv_model += f"    init(man_c) := {sokoban_pos[0]};\n"
-    smv_model += f"    init(man_r) := {sokoban_pos[1]};\n"
+    out.write("ASSIGN\n")
+    out.write(f"    init(man_c) := {sokoban_pos[0]};\n")
+    out.write(f"    init(man_r) := {sokoban_pos[1]};\n")
 
     for i, box in enumerate(boxes):
-        smv_model += f"    init(box_{i + 1}_c) := {box[0]};\n"
-        smv_model += f"    init(box_{i + 1}_r) := {box[1]};\n"
+        out.write(f"    init(box_{i + 1}_c) := {box[0]};\n")
+        out.write(f"    init(box_{i + 1}_r) := {box[1]};\n")
 
     for i, goal in enumerate(goals):
-        smv_model += f"    goal_{i + 1}_c := {goal[0]};\n"
-        smv_model += f"    goal_{i + 1}_r := {goal[1]};\n"
+        out.write(f"    goal_{i + 1}_c := {goal[0]};\n")
+        out.write(f"    goal_{i + 1}_r := {goal[1]};\n")
 
     # Initialize walls
     for r in range(1, rows + 1):
         for c in range(1, cols + 1):
-            wall_value = 1 if (c, r) in walls else 0
-            smv_model += f"    walls[{r}][{c}] := {wall_value};\n"
+            wall_value = 1 if grid.is_wall(c, r) else 0
+            out.write(f"    walls[{r}][{c}] := {wall_value};\n")
 
     # Transitions
-    smv_model += "next(man_c) :=\n"
-    smv_model += "    case\n"
-    smv_model += "        move = r & (mv_r | push_r) & (man_c < {cols}) : man_c + 1;\n"
-    smv_model += "        move = l & (mv_l | push_l) & (man_c > 1) : man_c - 1;\n"
-    smv_model += "        move = u : man_c;\n"
-    smv_model += "        move = d : man_c;\n"
-    smv_model += "        TRUE : man_c;\n"
-    smv_model += "    esac;\n"
-
-    smv_model += "next(man_r) :=\n"
-    smv_model += "    case\n"
-    smv_model += "        move = r : man_r;\n"
-    smv_model += "        move = l : man_r;\n"
-    smv_model += "        move = u & (mv_u | push_u) & (man_r > 1) : man_r - 1;\n"
-    smv_model += "        move = d & (mv_d | push_d) & (man_r < {rows}) : man_r + 1;\n"
-    smv_model += "        TRUE : man_r;\n"
-    smv_model += "    esac;\n"
+    out.write("next(man_c) :=\n")
+    out.write("    case\n")
+    out.write("        move = r & (mv_r | push_r) & (man_c < {cols}) : man_c + 1;\n")
+    out.write("        move = l & (mv_l | push_l) & (man_c > 1) : man_c - 1;\n")
+    out.write("        move = u : man_c;\n")
+    out.write("        move = d : man_c;\n")
+    out.write("        TRUE : man_c;\n")
+    out.write("    esac;\n")
+
+    out.write("next(man_r) :=\n")
+    out.write("    case\n")
+    out.write("        move = r : man_r;\n")
+    out.write("        move = l : man_r;\n")
+    out.write("        move = u & (mv_u | push_u) & (man_r > 1) : man_r - 1;\n")
+    out.write("        move = d & (mv_d | push_d) & (man_r < {rows}) : man_r + 1;\n")
+    out.write("        TRUE : man_r;\n")
+    out.write("    esac;\n")
 
     for i in range(len(boxes)):
-        smv_model += f"next(box_{i + 1}_c) :=\n"
-        smv_model += "    case\n"
-        smv_model += f"        push_l & (box_{i + 1}_c < {str(cols)}) : box_{i + 1}_c - 1;\n"
-        smv_model += f"        push_r & (box_{i + 1}_c > 1) : box_{i + 1}_c + 1;\n"
-        smv_model += "        TRUE: box_{i+1}_c;\n"
-        smv_model += "    esac;\n"
-
-        smv_model += f"next(box_{i + 1}_r) :=\n"
-        smv_model += "    case\n"
-        smv_model += f"        push_u & (box_{i + 1}_r > 1) : box_{i + 1}_r - 1;\n"
-        smv_model += f"        push_d & (box_{i + 1}_r < {str(rows)}) : box_{i + 1}_r + 1;\n"
-        smv_model += "        TRUE: box_{i+1}_r;\n"
-        smv_model += "    esac;\n"
+        out.write(f"next(box_{i + 1}_c) :=\n")
+        out.write("    case\n")
+        out.write(f"        push_l & (box_{i + 1}_c < {str(cols)}) : box_{i + 1}_c - 1;\n")
+        out.write(f"        push_r & (box_{i + 1}_c > 1) : box_{i + 1}_c + 1;\n")
+        out.write("        TRUE: box_{i+1}_c;\n")
+        out.write("    esac;\n")
+
+        out.write(f"next(box_{i + 1}_r) :=\n")
+        out.write("    case\n")
+        out.write(f"        push_u & (box_{i + 1}_r > 1) : box_{i + 1}_r - 1;\n")
+        out.write(f"        push_d & (box_{i + 1}_r < {str(rows)}) : box_{i + 1}_r + 1;\n")
+        out.write("        TRUE: box_{i+1}_r;\n")
+        out.write("    esac;\n")
 
     # Define conditions
-    smv_model += "DEFINE\n"
-    smv_model += "    mv_r := (move = r) & (man_c < {cols}) & (walls[man_r][man_c + 1] = 0) & !box_on_r;\n"
-    smv_model += "    mv_l := (move = l) & (man_c > 1) & (walls[man_r][man_c - 1] = 0) & !box_on_l;\n"
-    smv_model += "    mv_u := (move = u) & (man_r > 1) & (walls[man_r - 1][man_c] = 0) & !box_on_t;\n"
-    smv_model += "    mv_d := (move = d) & (man_r < {rows}) & (walls[man_r + 1][man_c] = 0) & !box_on_b;\n"
+    out.write("DEFINE\n")
+    out.write("    mv_r := (move = r) & (man_c < {cols}) & (walls[man_r][man_c + 1] = 0) & !box_on_r;\n")
+    out.write("    mv_l := (move = l) & (man_c > 1) & (walls[man_r][man_c - 1] = 0) & !box_on_l;\n")
+    out.write("    mv_u := (move = u) & (man_r > 1) & (walls[man_r - 1][man_c] = 0) & !box_on_t;\n")
+    out.write("    mv_d := (move = d) & (man_r < {rows}) & (walls[man_r + 1][man_c] = 0) & !box_on_b;\n")
 
     for i in range(len(boxes)):
-        smv_model += f"    box_{i + 1}_on_r := (man_c + 1 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_rp1 := (man_c + 2 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_l := (man_c - 1 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_lp1 := (man_c - 2 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_t := (man_c = box_{i + 1}_c) & (man_r - 1 = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_tp1 := (man_c = box_{i + 1}_c) & (man_r - 2 = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_b := (man_c = box_{i + 1}_c) & (man_r + 1 = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_bp1 := (man_c = box_{i + 1}_c) & (man_r + 2 = box_{i + 1}_r);\n"
+        out.write(f"    box_{i + 1}_on_r := (man_c + 1 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_rp1 := (man_c + 2 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_l := (man_c - 1 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_lp1 := (man_c - 2 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_t := (man_c = box_{i + 1}_c) & (man_r - 1 = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_tp1 := (man_c = box_{i + 1}_c) & (man_r - 2 = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_b := (man_c = box_{i + 1}_c) & (man_r + 1 = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_bp1 := (man_c = box_{i + 1}_c) & (man_r + 2 = box_{i + 1}_r);\n")
     for i in range(len(boxes)):
-        smv_model += "    push_r := (move = r) & (walls[man_r][man_c + 2] = 0) & !box_on_rp1 & box_on_r;\n"
-        smv_model += "    push_l := (move = l) & (walls[man_r][man_c - 2] = 0) & !box_on_lp1 & box_on_l;\n"
-        smv_model += "    push_u := (move = u) & (walls[man_r - 2][man_c] = 0) & !box_on_tp1 & box_on_t;\n"
-        smv_model += "    push_d := (move = d) & (walls[man_r + 2][man_c] = 0) & !box_on_bp1 & box_on_b;\n"
+        out.write("    push_r := (move = r) & (walls[man_r][man_c + 2] = 0) & !box_on_rp1 & box_on_r;\n")
+        out.write("    push_l := (move = l) & (walls[man_r][man_c - 2] = 0) & !box_on_lp1 & box_on_l;\n")
+        out.write("    push_u := (move = u) & (walls[man_r - 2][man_c] = 0) & !box_on_tp1 & box_on_t;\n")
+        out.write("    push_d := (move = d) & (walls[man_r + 2][man_c] = 0) & !box_on_bp1 & box_on_b;\n")
 
     # Winning condition: Any box on any goal
-    smv_model += "    win := "
+    out.write("    win := ")
     for i in range(len(boxes)):
         for j in range(len(goals)):
-            smv_model += f"(box_{i + 1}_c = goal_{j + 1}_c) & (box_{i + 1}_r = goal_{j + 1}_r)"
+            out.write(f"(box_{i + 1}_c = goal_{j + 1}_c) & (box_{i + 1}_r = goal_{j + 1}_r)")
             if i < len(boxes) - 1 or j < len(goals) - 1:
-                smv_model += " | "
-    smv_model += ";\n"
+                out.write(" | ")
+    out.write(";\n")
 
     # LTL specification
-    smv_model += "LTLSPEC !F win;\n"
+    out.write("LTLSPEC !F win;\n")
+@smv_emitter
+def generate_smv_model_old(board, sokoban_pos, boxes, goals, grid, out=None):
+    rows = grid.rows
+    cols = grid.cols
 
-    return smv_model
-def generate_smv_model_old(board, sokoban_pos, boxes, goals, walls):
-    rows = len(board)
-    cols = len(board[0]) if rows > 0 else 0
-
-    smv_model = f"MODULE main\nVAR\n"
+    out.write("MODULE main\nVAR\n")
 
     # Variables for Sokoban position
-    smv_model += f"    man_c : 1..{cols};\n"
-    smv_model += f"    man_r : 1..{rows};\n"
+    out.write(f"    man_c : 1..{cols};\n")
+    out.write(f"    man_r : 1..{rows};\n")
 
     # Variables for boxes
     for i, box in enumerate(boxes):
-        smv_model += f"    box_{i + 1}_c : 1..{cols};\n"
-        smv_model += f"    box_{i + 1}_r : 1..{rows};\n"
+        out.write(f"    box_{i + 1}_c : 1..{cols};\n")
+        out.write(f"    box_{i + 1}_r : 1..{rows};\n")
 
     # Variables for goals
     for i, goal in enumerate(goals):
-        smv_model += f"    goal_{i + 1}_c : 1..{cols};\n"
-        smv_model += f"    goal_{i + 1}_r : 1..{rows};\n"
+        out.write(f"    goal_{i + 1}_c : 1..{cols};\n")
+        out.write(f"    goal_{i + 1}_r : 1..{rows};\n")
 
     # Walls as a 2D array
-    smv_model += f"    walls : array 1..{rows} of array 1..{cols} of 0..1;\n"
+    out.write(f"    walls : array 1..{rows} of array 1..{cols} of 0..1;\n")
 
     # Initial conditions
-    smv_model += "ASSIGN\n"
-    smv_model += f"    init(man_c) := {sokoban_pos[0]};\n"
-    smv_model += f"    init(man_r) := {sokoban_pos[1]};\n"
+    out.write("ASSIGN\n")
+    out.write(f"    init(man_c) := {sokoban_pos[0]};\n")
+    out.write(f"    init(man_r) := {sokoban_pos[1]};\n")
 
     for i, box in enumerate(boxes):
-        smv_model += f"    init(box_{i + 1}_c) := {box[0]};\n"
-        smv_model += f"    init(box_{i + 1}_r) := {box[1]};\n"
+        out.write(f"    init(box_{i + 1}_c) := {box[0]};\n")
+        out.write(f"    init(box_{i + 1}_r) := {box[1]};\n")
 
     for i, goal in enumerate(goals):
-        smv_model += f"    goal_{i + 1}_c := {goal[0]};\n"
-        smv_model += f"    goal_{i + 1}_r := {goal[1]};\n"
+        out.write(f"    goal_{i + 1}_c := {goal[0]};\n")
+        out.write(f"    goal_{i + 1}_r := {goal[1]};\n")
 
     # Initialize walls
     for r in range(1, rows + 1):
         for c in range(1, cols + 1):
-            wall_value = 1 if (c, r) in walls else 0
-            smv_model += f"    walls[{r}][{c}] := {wall_value};\n"
+            wall_value = 1 if grid.is_wall(c, r) else 0
+            out.write(f"    walls[{r}][{c}] := {wall_value};\n")
 
     # Transitions
-    smv_model += "next(man_c) :=\n"
-    smv_model += "    case\n"
-    smv_model += "        move = r & (mv_r | push_r) & (man_c < {cols}) : man_c + 1;\n"
-    smv_model += "        move = l & (mv_l | push_l) & (man_c > 1) : man_c - 1;\n"
-    smv_model += "        move = u : man_c;\n"
-    smv_model += "        move = d : man_c;\n"
-    smv_model += "        TRUE : man_c;\n"
-    smv_model += "    esac;\n"
-
-    smv_model += "next(man_r) :=\n"
-    smv_model += "    case\n"
-    smv_model += "        move = r : man_r;\n"
-    smv_model += "        move = l : man_r;\n"
-    smv_model += "        move = u & (mv_u | push_u) & (man_r > 1) : man_r - 1;\n"
-    smv_model += "        move = d & (mv_d | push_d) & (man_r < {rows}) : man_r + 1;\n"
-    smv_model += "        TRUE : man_r;\n"
-    smv_model += "    esac;\n"
+    out.write("next(man_c) :=\n")
+    out.write("    case\n")
+    out.write("        move = r & (mv_r | push_r) & (man_c < {cols}) : man_c + 1;\n")
+    out.write("        move = l & (mv_l | push_l) & (man_c > 1) : man_c - 1;\n")
+    out.write("        move = u : man_c;\n")
+    out.write("        move = d : man_c;\n")
+    out.write("        TRUE : man_c;\n")
+    out.write("    esac;\n")
+
+    out.write("next(man_r) :=\n")
+    out.write("    case\n")
+    out.write("        move = r : man_r;\n")
+    out.write("        move = l : man_r;\n")
+    out.write("        move = u & (mv_u | push_u) & (man_r > 1) : man_r - 1;\n")
+    out.write("        move = d & (mv_d | push_d) & (man_r < {rows}) : man_r + 1;\n")
+    out.write("        TRUE : man_r;\n")
+    out.write("    esac;\n")
 
     for i in range(len(boxes)):
-        smv_model += f"next(box_{i + 1}_c) :=\n"
-        smv_model += "    case\n"
-        smv_model += f"        push_l & (box_{i + 1}_c < {str(cols)}) : box_{i + 1}_c - 1;\n"
-        smv_model += f"        push_r & (box_{i + 1}_c > 1) : box_{i + 1}_c + 1;\n"
-        smv_model += "        TRUE: box_{i+1}_c;\n"
-        smv_model += "    esac;\n"
-
-        smv_model += f"next(box_{i + 1}_r) :=\n"
-        smv_model += "    case\n"
-        smv_model += f"        push_u & (box_{i + 1}_r > 1) : box_{i + 1}_r - 1;\n"
-        smv_model += f"        push_d & (box_{i + 1}_r < {str(rows)}) : box_{i + 1}_r + 1;\n"
-        smv_model += "        TRUE: box_{i+1}_r;\n"
-        smv_model += "    esac;\n"
+        out.write(f"next(box_{i + 1}_c) :=\n")
+        out.write("    case\n")
+        out.write(f"        push_l & (box_{i + 1}_c < {str(cols)}) : box_{i + 1}_c - 1;\n")
+        out.write(f"        push_r & (box_{i + 1}_c > 1) : box_{i + 1}_c + 1;\n")
+        out.write("        TRUE: box_{i+1}_c;\n")
+        out.write("    esac;\n")
+
+        out.write(f"next(box_{i + 1}_r) :=\n")
+        out.write("    case\n")
+        out.write(f"        push_u & (box_{i + 1}_r > 1) : box_{i + 1}_r - 1;\n")
+        out.write(f"        push_d & (box_{i + 1}_r < {str(rows)}) : box_{i + 1}_r + 1;\n")
+        out.write("        TRUE: box_{i+1}_r;\n")
+        out.write("    esac;\n")
 
     # Define conditions
-    smv_model += "DEFINE\n"
-    smv_model += "    mv_r := (move = r) & (man_c < {cols}) & (walls[man_r][man_c + 1] = 0) & !box_on_r;\n"
-    smv_model += "    mv_l := (move = l) & (man_c > 1) & (walls[man_r][man_c - 1] = 0) & !box_on_l;\n"
-    smv_model += "    mv_u := (move = u) & (man_r > 1) & (walls[man_r - 1][man_c] = 0) & !box_on_t;\n"
-    smv_model += "    mv_d := (move = d) & (man_r < {rows}) & (walls[man_r + 1][man_c] = 0) & !box_on_b;\n"
+    out.write("DEFINE\n")
+    out.write("    mv_r := (move = r) & (man_c < {cols}) & (walls[man_r][man_c + 1] = 0) & !box_on_r;\n")
+    out.write("    mv_l := (move = l) & (man_c > 1) & (walls[man_r][man_c - 1] = 0) & !box_on_l;\n")
+    out.write("    mv_u := (move = u) & (man_r > 1) & (walls[man_r - 1][man_c] = 0) & !box_on_t;\n")
+    out.write("    mv_d := (move = d) & (man_r < {rows}) & (walls[man_r + 1][man_c] = 0) & !box_on_b;\n")
 
     for i in range(len(boxes)):
-        smv_model += f"    box_{i + 1}_on_r := (man_c + 1 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_rp1 := (man_c + 2 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_l := (man_c - 1 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_lp1 := (man_c - 2 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_t := (man_c = box_{i + 1}_c) & (man_r - 1 = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_tp1 := (man_c = box_{i + 1}_c) & (man_r - 2 = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_b := (man_c = box_{i + 1}_c) & (man_r + 1 = box_{i + 1}_r);\n"
-        smv_model += f"    box_{i + 1}_on_bp1 := (man_c = box_{i + 1}_c) & (man_r + 2 = box_{i + 1}_r);\n"
+        out.write(f"    box_{i + 1}_on_r := (man_c + 1 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_rp1 := (man_c + 2 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_l := (man_c - 1 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_lp1 := (man_c - 2 = box_{i + 1}_c) & (man_r = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_t := (man_c = box_{i + 1}_c) & (man_r - 1 = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_tp1 := (man_c = box_{i + 1}_c) & (man_r - 2 = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_b := (man_c = box_{i + 1}_c) & (man_r + 1 = box_{i + 1}_r);\n")
+        out.write(f"    box_{i + 1}_on_bp1 := (man_c = box_{i + 1}_c) & (man_r + 2 = box_{i + 1}_r);\n")
     for i in range(len(boxes)):
-        smv_model += "    push_r := (move = r) & (walls[man_r][man_c + 2] = 0) & !box_on_rp1 & box_on_r;\n"
-        smv_model += "    push_l := (move = l) & (walls[man_r][man_c - 2] = 0) & !box_on_lp1 & box_on_l;\n"
-        smv_model += "    push_u := (move = u) & (walls[man_r - 2][man_c] = 0) & !box_on_tp1 & box_on_t;\n"
-        smv_model += "    push_d := (move = d) & (walls[man_r + 2][man_c] = 0) & !box_on_bp1 & box_on_b;\n"
+        out.write("    push_r := (move = r) & (walls[man_r][man_c + 2] = 0) & !box_on_rp1 & box_on_r;\n")
+        out.write("    push_l := (move = l) & (walls[man_r][man_c - 2] = 0) & !box_on_lp1 & box_on_l;\n")
+        out.write("    push_u := (move = u) & (walls[man_r - 2][man_c] = 0) & !box_on_tp1 & box_on_t;\n")
+        out.write("    push_d := (move = d) & (walls[man_r + 2][man_c] = 0) & !box_on_bp1 & box_on_b;\n")
 
     # Winning condition
-    smv_model += "    win := "
+    out.write("    win := ")
     for i in range(len(boxes)):
-        smv_model += f"(box_{i + 1}_c = goal_{i + 1}_c) & (box_{i + 1}_r = goal_{i + 1}_r)"
+        out.write(f"(box_{i + 1}_c = goal_{i + 1}_c) & (box_{i + 1}_r = goal_{i + 1}_r)")
         if i < len(boxes) - 1:
-            smv_model += " & "
-    smv_model += ";\n"
+            out.write(" & ")
+    out.write(";\n")
 
     # LTL specification
-    smv_model += "LTLSPEC !F win;\n"
-
-    return smv_model
-import subprocess
-
-def run_nusmv_and_check(filename,bound=20,engine='sat'):
-    # Commands to run in NuSMV interactive mode
-    # SAT‐based bounded check of !F win up to 'bound'
-    run_cmd = f"check_ltlspec_bmc -k {bound}"
-
-    
-    commands = "\n".join([
-        f"set engine {engine}", #switch to BDD or SAT
-        "read_model",
-        "flatten_hierarchy",
-        "encode_variables",
-        "build_boolean_model",
-        "bmc_setup",
-        run_cmd, 
-        "quit"
-    ]) + "\n"
-
-
-    
+    out.write("LTLSPEC !F win;\n")
+
+
+def run_skoban_board(out_dir, idx, board, bmc_bound=20, model_options=None, pool=None, portfolio=False, ceiling=None, cache=None, native=None, native_engine="astar"):
+    # Generate and check a single board, returning its SAT and BDD result
+    # dicts. Errors are reported and end this board only.
+    # native="route" solves the board with the in-process push search
+    # instead of nuXmv; native="prefilter" tries a small search first and
+    # only hands the board to nuXmv when that did not settle it.
+    # native_engine picks the search: "bfs", "astar" or "idastar".
+    results = []
+    print(f"\n=== Processing board #{idx} ===")
     try:
-        # Time the whole NuSMV invocation:
-        start = time.perf_counter()
-        # Run NuSMV with the commands
-        result = subprocess.run(
-            [r"G:\My Drive\Asaf\Masters and PhD\PhD\Courses\Formal Verification and Synthesis - Hilel Kugler\nuXmv\bin\nuXmv.exe", "-int", filename],
-            input=commands.encode("utf-8"),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            timeout=60  # seconds
-        )
-        elapsed = time.perf_counter() - start
-
-        
-
-        output = result.stdout.decode("utf-8")
-        error_output = result.stderr.decode("utf-8")
-
-
-        if error_output:
-            print("NuSMV error output:\n", error_output)
-
-        # Debug: show nuXmv’s verdict
-        print(f"\n--- nuXmv output for {filename} ---\n{output}")
-
-        # Extract CPU & memory from NuSMV’s stdout if present:
-        cpu = None
-        mem = None
-        m = re.search(r"cpu time.*?([0-9]+\.[0-9]+)", output, re.IGNORECASE)
-        if m: cpu = float(m.group(1))
-        m = re.search(r"memory used.*?([0-9]+\.[0-9]+)\s*mb", output, re.IGNORECASE)
-        if m: mem = float(m.group(1))
-        
-        # Parse the result of check_ltlspec_bmc
-        #If spec is true we loose no winning condition exisits
-        #When spec is false we win 
-        if "is false" in output.lower():
-            print("\n LTL Specification FAILED (is false).")
-            winnable = True
-        
+        sokoban_pos, boxes, goals, grid = parse_board(board)
+        if native:
+            max_nodes = NATIVE_PREFILTER_NODES if native == "prefilter" else 1_000_000
+            solve = SOLVERS[native_engine]
+            stats = cached_run(cache, board, None, f"native-{native_engine}", max_nodes,
+                               lambda: solve(sokoban_pos, boxes, goals, grid, max_nodes=max_nodes))
+            stats.update({"board": idx})
+            print(f"--> native push search ({stats['nodes']} states) says: {stats['status']}")
+            if native == "route" or stats["status"] != UNKNOWN:
+                results.append(stats)
+                return results
+
+        fname = os.path.join(out_dir, f"sokoban_{idx}.smv")
+        with open(fname, "w") as f:
+            generate_smv_model(board, sokoban_pos, boxes, goals, grid, out=f, **(model_options or {}))
+
+        if portfolio:
+            # Only the verdict is needed: race the engines instead
+            stats = cached_run(cache, board, model_options, "portfolio", bmc_bound,
+                               lambda: run_portfolio(fname, bound=bmc_bound, board=board))
+            stats.update({"board": idx})
+            results.append(stats)
+            print(f"--> {stats['engine'].upper()} (bound={bmc_bound}) says: {stats['status']}")
+            return results
+
+        # 1) SAT-based BMC with your negated spec !F win
+        if ceiling:
+            # One incremental BMC run over every length up to the ceiling
+            # instead of one fixed bound
+            sat_stats = cached_run(cache, board, model_options, "sat", ceiling,
+                                   lambda: run_bound_escalation(fname, ceiling=ceiling, pool=pool, board=board))
         else:
-            print("\n  Could not find counter example to fail LTL check")
-            winnable = False
-        # Return a summary dict
-        return {
-            "filename": filename,
-            "engine": engine,
-            "spec": run_cmd,
-            "winnable": winnable,
-            "elapsed": elapsed,
-            "cpu": cpu,
-            "mem": mem,
-            "stdout": output,
-            "stderr": error_output
-        }    
-    
-    except FileNotFoundError:
-        print("Error: NuSMV executable not found. Make sure it is installed and in your PATH.")
-    except subprocess.TimeoutExpired:
-        print("Error: NuSMV process timed out.")
-
-
-def run_skoban(out_dir, boards,bmc_bound=20):
+            sat_stats = cached_run(cache, board, model_options, "sat", bmc_bound,
+                                   lambda: run_nusmv_and_check(filename=fname,bound=bmc_bound,engine="sat",pool=pool,board=board))
+        sat_stats.update({"board": idx})
+        results.append(sat_stats)
+        print(f"--> SAT (bound={sat_stats['bound']}) says: {sat_stats['status']}")
+
+        # 2) “Depth 0” under the BDD engine (still checking !F win)
+        bdd_stats = cached_run(cache, board, model_options, "bdd", bmc_bound,
+                               lambda: run_nusmv_and_check(filename=fname,bound=bmc_bound,engine="bdd",pool=pool,board=board))
+        bdd_stats.update({"board": idx})
+        results.append(bdd_stats)
+        print(f"--> BDD (bound=0) says: {bdd_stats['status']}")
+
+    except Exception as e:
+        # Catch any Python errors (e.g. file not found, model-gen bug)
+        print(f"!!! ERROR on board {idx}: {e}")
+    return results
+
+def run_skoban(out_dir, boards,bmc_bound=20, model_options=None, pool=None, workers=1, portfolio=False, ceiling=None, cache=None, native=None, native_engine="astar"):
     results = []
     os.makedirs(out_dir, exist_ok=True)
 
-    for idx, board in enumerate(boards, start=1):
-        print(f"\n=== Processing board #{idx} ===")
-        try:
-            sokoban_pos, boxes, goals, walls = parse_board(board)
-            smv = generate_smv_model(board, sokoban_pos, boxes, goals, walls)
-
-            fname = os.path.join(out_dir, f"sokoban_{idx}.smv")
-            with open(fname, "w") as f:
-                f.write(smv)
-
-            # 1) SAT-based BMC with your negated spec !F win
-            sat_stats = run_nusmv_and_check(filename=fname,bound=bmc_bound,engine="sat")
-            sat_stats.update({"board": idx})
-            results.append(sat_stats)
-            print(f"--> SAT (bound={bmc_bound}) says: {'winnable' if sat_stats['winnable'] else 'NOT winnable'}")
-
-            # 2) “Depth 0” under the BDD engine (still checking !F win)
-            bdd_stats = run_nusmv_and_check(filename=fname,bound=bmc_bound,engine="bdd")
-            bdd_stats.update({"board": idx})
-            results.append(bdd_stats)
-            print(f"--> BDD (bound=0) says: {'winnable' if bdd_stats['winnable'] else 'NOT winnable'}")
-
-        except Exception as e:
-            # Catch any Python errors (e.g. file not found, model-gen bug)
-            print(f"!!! ERROR on board {idx}: {e}")
-            # continue with next board rather than aborting
-            continue
+    # nuXmv runs in its own process, so worker threads are enough to keep
+    # several solvers busy. Pass a pool with at least `workers` sessions.
+    # Results are collected in board order, whatever order they finish in.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        jobs = [executor.submit(run_skoban_board, out_dir, idx, board, bmc_bound, model_options, pool, portfolio, ceiling, cache, native, native_engine)
+                for idx, board in enumerate(boards, start=1)]
+        for job in jobs:
+            results.extend(job.result())
     return results
 
+def compare_encodings(out_dir, boards, encodings, bmc_bound=20, engines=("sat", "bdd"), pool=None):
+    # Benchmark model encodings against each other: every board is generated
+    # once per named set of generate_smv_model options and checked with each
+    # engine. Returns the run_nusmv_and_check dicts tagged with the encoding.
+    results = []
+    os.makedirs(out_dir, exist_ok=True)
+
+    for name, options in encodings.items():
+        for idx, board in enumerate(boards, start=1):
+            print(f"\n=== Benchmarking board #{idx} with encoding '{name}' ===")
+            try:
+                sokoban_pos, boxes, goals, grid = parse_board(board)
+                fname = os.path.join(out_dir, f"sokoban_{idx}_{name}.smv")
+                with open(fname, "w") as f:
+                    generate_smv_model(board, sokoban_pos, boxes, goals, grid, out=f, **options)
+                model_kb = os.path.getsize(fname) / 1024
+
+                for engine in engines:
+                    stats = run_nusmv_and_check(filename=fname, bound=bmc_bound, engine=engine, pool=pool, board=board)
+                    if stats is None:
+                        # nuXmv missing or timed out, already reported
+                        continue
+                    stats.update({"board": idx, "encoding": name, "model_kb": model_kb})
+                    results.append(stats)
+
+            except Exception as e:
+                print(f"!!! ERROR on board {idx} ({name}): {e}")
+                continue
+    return results
+
+
+def print_encoding_table(results):
+    # Winnable: Yes = solved, No = proved unsolvable, ? = unknown within the bound
+    print("| Board | Encoding | Engine | Model (KB) | Winnable | Time (s) | CPU (s) | Mem (MB) |")
+    print("|:-----:|:--------:|:------:|:----------:|:--------:|:--------:|:-------:|:--------:|")
+    for r in sorted(results, key=lambda r: (r['board'], r['engine'], r['encoding'])):
+        print(f"|   {r['board']}   | {r['encoding']:<12} | {r['engine'].upper():<3}   "
+              f"| {r['model_kb']:8.1f}   "
+              f"|   {'Yes' if r['winnable'] else 'No' if r['status'] == PROVED_UNSOLVABLE else '?'}    | "
+              f"{r['elapsed']:.2f}    | "
+              f"{(r['cpu'] or 0):.2f}    | "
+              f"{(r['mem'] or 0):.2f}    |")
+
 #Example usage
 if __name__ == "__main__":
     # Example board
@@ -569,15 +602,62 @@ if __name__ == "__main__":
     out_dir = r"G:\My Drive\Asaf\Masters and PhD\PhD\Courses\Formal Verification and Synthesis - Hilel Kugler\Final Project\main\generated_models"
     #smv_file = "my_model.smv"  # Replace with your actual file
     #run_nusmv_and_check(smv_file)
-    all_stats = run_skoban(out_dir, boards, bmc_bound=10)
+    # Re-runs reuse the verdicts of boards and encodings already checked
+    cache = ResultCache(os.path.join(out_dir, "cache"))
+    all_stats = run_skoban(out_dir, boards, bmc_bound=10, cache=cache)
     # Example: print a simple summary table
     print("\nSummary:")
+    # Winnable: Yes = solved, No = proved unsolvable, ? = unknown within the bound
     print("| Board | Engine | Bound | Winnable | Time (s) | CPU (s) | Mem (MB) |")
     print("|:-----:|:------:|:-----:|:--------:|:--------:|:-------:|:--------:|")
     for r in all_stats:
         print(f"|   {r['board']}   | {r['engine'].upper():<3}   |  {r['spec'].split()[-1]:<3}   "
-              f"|   {'Yes' if r['winnable'] else 'No'}    | "
+              f"|   {'Yes' if r['winnable'] else 'No' if r['status'] == PROVED_UNSOLVABLE else '?'}    | "
               f"{r['elapsed']:.2f}    | "
               f"{(r['cpu'] or 0):.2f}    | "
 
-              f"{(r['mem'] or 0):.2f}    |")
\ No newline at end of file
+              f"{(r['mem'] or 0):.2f}    |")
+
+    # Walls/goals as VARs (current model) vs. folded into constants, and
+    # the move as a state VAR vs. an IVAR, and coordinates vs. floor cells
+    # with and without dead-square pruning, and per-box cells vs. a box bitmap
+    # or per-cell occupancy defines, and one step vs. one push per transition
+    encodings = {
+        "walls_var": {},
+        "walls_const": {"const_walls": True},
+        "consts": {"const_walls": True, "const_goals": True},
+        "consts_ivar": {"const_walls": True, "const_goals": True, "move_ivar": True},
+        "cells_ivar": {"cell_index": True, "const_goals": True, "move_ivar": True},
+        "cells_dead": {"cell_index": True, "const_goals": True, "move_ivar": True, "prune_dead": True},
+        "cells_bitmap": {"cell_index": True, "move_ivar": True, "box_bitmap": True},
+        "cells_occ": {"cell_index": True, "move_ivar": True, "occupancy": True},
+        "push_level": {"push_level": True, "prune_dead": True},
+    }
+    # Many small runs: keep one nuXmv process alive across all of them
+    with SessionPool(size=1) as pool:
+        bench_stats = compare_encodings(out_dir, boards, encodings, bmc_bound=10, pool=pool)
+    print("\nEncoding benchmark:")
+    print_encoding_table(bench_stats)
+
+    # LTL BMC next to the invariant engines, all on the same INVARSPEC !win model
+    invar_encodings = {
+        "cells_invar": {"cell_index": True, "move_ivar": True, "box_bitmap": True, "invar_spec": True},
+    }
+    with SessionPool(size=1) as pool:
+        invar_stats = compare_encodings(out_dir, boards, invar_encodings, bmc_bound=10,
+                                        engines=("sat", "invar_bmc", "invar_kind", "invar_ic3", "invar_bdd"), pool=pool)
+    print("\nInvariant engines:")
+    print_encoding_table(invar_stats)
+
+    # Duplicate detection for the native search: tuples of box coordinates in
+    # a set vs. Zobrist hashes in a fixed-size open-addressing table
+    print("\nTransposition benchmark:")
+    # Bytes/state includes the table's free slots; Load is how full it is
+    print("| Board | Method | States | Nodes/s | Bytes/state | Entry bytes | Load |")
+    print("|:-----:|:------:|:------:|:-------:|:-----------:|:-----------:|:----:|")
+    for idx, board in enumerate(boards, start=1):
+        for r in benchmark_transpositions(*parse_board(board)):
+            entry = f"{r['entry_bytes']:>5}" if "entry_bytes" in r else "    -"
+            load = f"{r['load']:.2f}" if "load" in r else "   -"
+            print(f"|   {idx}   | {r['method']:<13} | {r['states']:>6} | "
+                  f"{(r['nodes_per_sec'] or 0):>9.0f} | {r['bytes_per_state']:>8.1f} | {entry} | {load} |")
\ No newline at end of file
@@ -0,0 +1,781 @@
+import array,collections,heapq,itertools,os,random,sys,time
+from nusmv_session import maxrss_mb
+from push_tables import UNREACHABLE, min_distances, push_distance_table
+
+try:
+    import resource
+except ImportError:
+    resource = None  # not on Windows
+
+
+# Same result states as the nuXmv runners
+SOLVED = "solved"
+PROVED_UNSOLVABLE = "proved_unsolvable"
+UNKNOWN = "unknown"
+
+# Directions in MOVE_STEPS order, with their opposites
+DIRS = [('r', 1, 0), ('l', -1, 0), ('u', 0, -1), ('d', 0, 1)]
+OPPOSITE = [1, 0, 3, 2]
+
+# Fixed seed, so a level's Zobrist keys are the same on every run
+ZOBRIST_SEED = 0x5B0C0BA
+
+# Freeze checks look at boxes up to this many cells away from the pushed box
+FREEZE_RADIUS = 2
+
+# States the relaxed search of one corral may visit before giving up
+CORRAL_NODES = 500
+
+# Entries each deadlock memo holds before it is emptied and starts over
+DEADLOCK_MEMO_ENTRIES = 200_000
+
+
+class Level:
+    """A parsed board prepared for explicit-state search.
+
+    Floor cells reachable from the player or a box are numbered 0..N-1 and
+    box sets are Python ints with bit i set for a box on cell i. A search
+    state packs the box bits above the player's normalised cell (the lowest
+    numbered cell the player can walk to), so states that differ only by
+    where the player stands inside the same area are the same state.
+    """
+
+    def __init__(self, sokoban_pos, boxes, goals, grid):
+        self.grid = grid
+        # Flood-fill the floor from the player and every box, as compile_board
+        # does, but number the cells in row-major order
+        seen = set([sokoban_pos] + list(boxes))
+        stack = list(seen)
+        while stack:
+            c, r = stack.pop()
+            for _, dc, dr in DIRS:
+                nxt = (c + dc, r + dr)
+                if nxt in seen or grid.is_wall(*nxt):
+                    continue
+                if not (1 <= nxt[0] <= grid.cols and 1 <= nxt[1] <= grid.rows):
+                    continue
+                seen.add(nxt)
+                stack.append(nxt)
+        self.cells = sorted(seen, key=lambda pos: (pos[1], pos[0]))
+        self.index = {pos: i for i, pos in enumerate(self.cells)}
+        n = len(self.cells)
+        self.cell_bits = max(n - 1, 1).bit_length()
+        self.cell_mask = (1 << self.cell_bits) - 1
+        # neighbours[d][i]: cell one step from i in direction d, -1 for a wall
+        self.neighbours = [[self.index.get((c + dc, r + dr), -1) for c, r in self.cells] for _, dc, dr in DIRS]
+
+        self.player = self.index[sokoban_pos]
+        self.box_mask = 0
+        for box in boxes:
+            self.box_mask |= 1 << self.index[box]
+        # A goal off this floor can never hold a box; since solved() asks for
+        # every box on a goal (not every goal covered), leaving it out of
+        # goal_mask changes nothing
+        self.goals = [self.index[goal] for goal in goals if goal in self.index]
+        self.goal_mask = 0
+        for goal in self.goals:
+            self.goal_mask |= 1 << goal
+        self.num_boxes = len(boxes)
+        self.live_mask = self.live_cells()
+        # Zobrist keys: a random 64-bit word per cell for a box there and for
+        # the (normalised) player there; a state hashes to the XOR of its words
+        rng = random.Random(ZOBRIST_SEED)
+        self.box_keys = [rng.getrandbits(64) for _ in self.cells]
+        self.player_keys = [rng.getrandbits(64) for _ in self.cells]
+
+    def __len__(self):
+        return len(self.cells)
+
+    def push_distances(self):
+        # goals x cells table: table[g][cell] is the fewest pushes that bring
+        # a box from cell to goal g on an otherwise empty board, UNREACHABLE
+        # where it never gets there (cached per board in push_tables)
+        return push_distance_table(self.cells, self.neighbours, self.goals)
+
+    def live_cells(self):
+        # Simple deadlock squares are the cells with no push distance to any
+        # goal; the rest are live
+        nearest = min_distances(self.push_distances(), len(self.cells))
+        mask = 0
+        for cell, dist in enumerate(nearest):
+            if dist < UNREACHABLE:
+                mask |= 1 << cell
+        return mask
+
+    def pack(self, box_mask, player):
+        return (box_mask << self.cell_bits) | player
+
+    def unpack(self, state):
+        return state >> self.cell_bits, state & self.cell_mask
+
+    def zobrist(self, state):
+        box_mask, player = self.unpack(state)
+        key = self.player_keys[player]
+        for box in self.box_cells(box_mask):
+            key ^= self.box_keys[box]
+        return key
+
+    def zobrist_push(self, key, state, box, d, child):
+        # Hash of a child from its parent's: only the pushed box and the
+        # normalised player changed
+        return (key ^ self.box_keys[box] ^ self.box_keys[self.neighbours[d][box]]
+                ^ self.player_keys[state & self.cell_mask] ^ self.player_keys[child & self.cell_mask])
+
+    def reachable(self, player, box_mask):
+        # Cells the player can walk to without pushing, as a bytearray
+        seen = bytearray(len(self.cells))
+        seen[player] = 1
+        stack = [player]
+        neighbours = self.neighbours
+        while stack:
+            cell = stack.pop()
+            for d in range(4):
+                nxt = neighbours[d][cell]
+                if nxt >= 0 and not seen[nxt] and not (box_mask >> nxt) & 1:
+                    seen[nxt] = 1
+                    stack.append(nxt)
+        return seen
+
+    def normalise(self, player, box_mask):
+        return self.reachable(player, box_mask).index(1)
+
+    def solved(self, box_mask):
+        # The models' win: every box stands on a goal. So every box has to
+        # reach a goal, which is what makes the live-cell pruning in
+        # pushes() and the deadlock tests sound whatever the counts.
+        return box_mask & ~self.goal_mask == 0
+
+    def box_cells(self, box_mask):
+        cells = []
+        while box_mask:
+            low = box_mask & -box_mask
+            cells.append(low.bit_length() - 1)
+            box_mask ^= low
+        return cells
+
+    def pushes(self, state):
+        # Successors of a packed state: (box cell, direction, next state)
+        box_mask, player = self.unpack(state)
+        reach = self.reachable(player, box_mask)
+        neighbours = self.neighbours
+        for box in self.box_cells(box_mask):
+            for d in range(4):
+                ahead = neighbours[d][box]
+                behind = neighbours[OPPOSITE[d]][box]
+                if ahead < 0 or behind < 0 or not reach[behind]:
+                    continue
+                if (box_mask >> ahead) & 1 or not (self.live_mask >> ahead) & 1:
+                    continue
+                moved = box_mask ^ (1 << box) ^ (1 << ahead)
+                yield box, d, self.pack(moved, self.normalise(box, moved))
+
+    def walk(self, start, end, box_mask):
+        # Shortest walk between two cells around the boxes, as move letters
+        parent = {start: None}
+        queue = collections.deque([start])
+        while queue and end not in parent:
+            cell = queue.popleft()
+            for d in range(4):
+                nxt = self.neighbours[d][cell]
+                if nxt >= 0 and nxt not in parent and not (box_mask >> nxt) & 1:
+                    parent[nxt] = (cell, d)
+                    queue.append(nxt)
+        path = []
+        while parent[end] is not None:
+            end, d = parent[end]
+            path.append(DIRS[d][0])
+        return path[::-1]
+
+    def moves(self, pushes):
+        # Expand a list of (box cell, direction) pushes into a LURD string
+        box_mask, player = self.box_mask, self.player
+        moves = []
+        for box, d in pushes:
+            moves += self.walk(player, self.neighbours[OPPOSITE[d]][box], box_mask)
+            moves.append(DIRS[d][0].upper())
+            box_mask ^= (1 << box) | (1 << self.neighbours[d][box])
+            player = box
+        return "".join(moves)
+
+
+class DeadlockDetector:
+    """Dynamic deadlock tests the native searches run after every push.
+
+    Freeze deadlock: the pushed box and the boxes holding it in place can
+    never move again, and one of them is off a goal. Corral deadlock: the
+    player cannot reach an area fenced by boxes, every fence box the player
+    can push goes into the area (a PI-corral), and the fence boxes alone
+    cannot all be pushed onto goals (a bounded search with every other box
+    removed; running out of budget means "not dead"). Results are memoised
+    on the local box pattern they depend on; a memo that reaches
+    DEADLOCK_MEMO_ENTRIES is emptied, which costs recomputation only.
+    """
+
+    def __init__(self, level):
+        self.level = level
+        # window[cell]: bits of the cells within FREEZE_RADIUS of cell; boxes
+        # outside it count as movable, so a miss is never a wrong answer
+        self.window = []
+        for c, r in level.cells:
+            mask = 0
+            for dc in range(-FREEZE_RADIUS, FREEZE_RADIUS + 1):
+                for dr in range(-FREEZE_RADIUS, FREEZE_RADIUS + 1):
+                    cell = level.index.get((c + dc, r + dr))
+                    if cell is not None:
+                        mask |= 1 << cell
+            self.window.append(mask)
+        self.freeze_memo = {}
+        self.corral_memo = {}
+        self.frozen = 0
+        self.corrals = 0
+        self.memo_hits = 0
+
+    def deadlocked(self, state, moved):
+        # True if the state reached by pushing a box onto `moved` is dead
+        if self.freeze(state >> self.level.cell_bits, moved):
+            self.frozen += 1
+            return True
+        if self.corral(state):
+            self.corrals += 1
+            return True
+        return False
+
+    def freeze(self, box_mask, moved):
+        pattern = box_mask & self.window[moved]
+        key = (moved, pattern)
+        dead = self.freeze_memo.get(key)
+        if dead is not None:
+            self.memo_hits += 1
+            return dead
+        frozen = []
+        dead = self._frozen(moved, pattern, 0, frozen) and any(not (self.level.goal_mask >> box) & 1 for box in frozen)
+        if len(self.freeze_memo) >= DEADLOCK_MEMO_ENTRIES:
+            self.freeze_memo.clear()
+        self.freeze_memo[key] = dead
+        return dead
+
+    def _frozen(self, cell, boxes, walls, frozen):
+        # Can the box on cell never move again? On each axis it is blocked by
+        # a wall, by dead squares on both sides, or by a box that is itself
+        # frozen (checked with this one as a wall, which ends the recursion).
+        # Boxes found frozen are appended to `frozen`.
+        level = self.level
+        walls |= 1 << cell
+        mark = len(frozen)
+        for axis in (0, 1):
+            ends = (level.neighbours[2 * axis][cell], level.neighbours[2 * axis + 1][cell])
+            if any(end < 0 or (walls >> end) & 1 for end in ends):
+                continue
+            if not any((level.live_mask >> end) & 1 for end in ends):
+                continue
+            if any((boxes >> end) & 1 and self._frozen(end, boxes, walls, frozen) for end in ends):
+                continue
+            # Free on this axis: whatever was found frozen relied on this box
+            del frozen[mark:]
+            return False
+        frozen.append(cell)
+        return True
+
+    def corral(self, state):
+        level = self.level
+        box_mask, player = level.unpack(state)
+        reach = level.reachable(player, box_mask)
+        seen = bytearray(len(level))
+        for start in range(len(level)):
+            if reach[start] or seen[start] or (box_mask >> start) & 1:
+                continue
+            # Flood one corral and collect the boxes fencing it
+            area = fence = 0
+            seen[start] = 1
+            stack = [start]
+            while stack:
+                cell = stack.pop()
+                area |= 1 << cell
+                for d in range(4):
+                    nxt = level.neighbours[d][cell]
+                    if nxt < 0 or seen[nxt]:
+                        continue
+                    if (box_mask >> nxt) & 1:
+                        fence |= 1 << nxt
+                    else:
+                        seen[nxt] = 1
+                        stack.append(nxt)
+            if self._dead_corral(player, box_mask, reach, area, fence):
+                return True
+        return False
+
+    def _dead_corral(self, player, box_mask, reach, area, fence):
+        level = self.level
+        neighbours = level.neighbours
+        if not fence & ~level.goal_mask:
+            return False
+        # PI-corral: the player reaches every fence box, and every push of a
+        # fence box it can make goes into the corral
+        for box in level.box_cells(fence):
+            if not any(n >= 0 and reach[n] for n in (neighbours[d][box] for d in range(4))):
+                return False
+            for d in range(4):
+                ahead = neighbours[d][box]
+                behind = neighbours[OPPOSITE[d]][box]
+                if ahead < 0 or behind < 0 or not reach[behind]:
+                    continue
+                if (box_mask >> ahead) & 1 or not (level.live_mask >> ahead) & 1:
+                    continue
+                if not (area >> ahead) & 1:
+                    return False
+
+        # Push the fence boxes on their own; removing boxes never makes a
+        # level harder, so if they cannot all reach goals the state is dead
+        root = level.pack(fence, level.normalise(player, fence))
+        dead = self.corral_memo.get(root)
+        if dead is not None:
+            self.memo_hits += 1
+            return dead
+        seen = {root}
+        frontier = [root]
+        dead = True
+        while frontier and dead:
+            if len(seen) > CORRAL_NODES:
+                dead = False
+                break
+            next_frontier = []
+            for state in frontier:
+                for box, d, child in level.pushes(state):
+                    if child in seen:
+                        continue
+                    boxes = child >> level.cell_bits
+                    if not boxes & ~level.goal_mask:
+                        dead = False
+                        break
+                    if self.freeze(boxes, neighbours[d][box]):
+                        continue
+                    seen.add(child)
+                    next_frontier.append(child)
+                if not dead:
+                    break
+            frontier = next_frontier
+        if len(self.corral_memo) >= DEADLOCK_MEMO_ENTRIES:
+            self.corral_memo.clear()
+        self.corral_memo[root] = dead
+        return dead
+
+
+def usage_snapshot():
+    times = os.times()
+    return time.perf_counter(), times.user, times.system
+
+
+def result_dict(level, engine, status, pushes, nodes, start):
+    # Same shape as run_nusmv_and_check's dict, so callers can mix them
+    wall, user, system = usage_snapshot()
+    max_rss_mb = None
+    if resource is not None:
+        # The search runs in-process, so this is the peak of the whole Python
+        # process so far (earlier boards and solvers included), not of this
+        # search alone; "rss_scope" says so next to the figure
+        max_rss_mb = maxrss_mb(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+    stats = {
+        "filename": None,
+        "engine": engine,
+        "spec": "push search",
+        "winnable": status == SOLVED,
+        "status": status,
+        "bound": len(pushes) if pushes is not None else None,
+        "elapsed": wall - start[0],
+        "cpu": (user - start[1]) + (system - start[2]),
+        "mem": max_rss_mb,
+        "user": user - start[1],
+        "sys": system - start[2],
+        "max_rss_mb": max_rss_mb,
+        "rss_scope": "process peak",
+        "nodes": nodes,
+        "stdout": None,
+        "stderr": "",
+    }
+    if pushes is not None:
+        stats["solution"] = level.moves(pushes)
+    return stats
+
+
+def solve_bfs(sokoban_pos, boxes, goals, grid, max_nodes=1_000_000):
+    # Breadth-first search over pushes, so the solution found has the fewest
+    # pushes. Exhausting the state space proves the board unsolvable;
+    # hitting max_nodes leaves it unknown.
+    start = usage_snapshot()
+    level = Level(sokoban_pos, boxes, goals, grid)
+    root = level.pack(level.box_mask, level.normalise(level.player, level.box_mask))
+    deadlocks = DeadlockDetector(level)
+    parents = {root: None}
+    frontier = [root]
+    goal = root if level.solved(level.box_mask) else None
+    while frontier and goal is None and len(parents) <= max_nodes:
+        next_frontier = []
+        for state in frontier:
+            for box, d, child in level.pushes(state):
+                if child in parents or deadlocks.deadlocked(child, level.neighbours[d][box]):
+                    continue
+                parents[child] = (state, box, d)
+                if level.solved(child >> level.cell_bits):
+                    goal = child
+                    break
+                next_frontier.append(child)
+            if goal is not None:
+                break
+        frontier = next_frontier
+
+    if goal is None:
+        status = UNKNOWN if frontier else PROVED_UNSOLVABLE
+        return result_dict(level, "native-bfs", status, None, len(parents), start)
+    pushes = []
+    while parents[goal] is not None:
+        goal, box, d = parents[goal]
+        pushes.append((box, d))
+    return result_dict(level, "native-bfs", SOLVED, pushes[::-1], len(parents), start)
+
+
+def min_cost_assignment(cost):
+    # Hungarian method (shortest augmenting paths with potentials) for an
+    # n x m cost matrix with n <= m: every row gets a distinct column.
+    # Returns (total, u, v) with the optimal duals: u[i] + v[j] <= cost[i][j],
+    # v[j] <= 0 and sum(u) + sum(v) == total.
+    n = len(cost)
+    m = len(cost[0]) if n else 0
+    inf = float("inf")
+    u = [0] * (n + 1)
+    v = [0] * (m + 1)
+    p = [0] * (m + 1)
+    way = [0] * (m + 1)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = [inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            delta = inf
+            j1 = 0
+            row = cost[i0 - 1]
+            for j in range(1, m + 1):
+                if not used[j]:
+                    cur = row[j - 1] - u[i0] - v[j]
+                    if cur < minv[j]:
+                        minv[j] = cur
+                        way[j] = j0
+                    if minv[j] < delta:
+                        delta = minv[j]
+                        j1 = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while True:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+            if j0 == 0:
+                break
+    total = sum(cost[p[j] - 1][j - 1] for j in range(1, m + 1) if p[j])
+    return total, u[1:], v[1:]
+
+
+class MatchingHeuristic:
+    """Lower bound on the pushes left: min-cost matching of boxes to goals.
+
+    A pair costs the box's push distance to that goal. The full match is the
+    Hungarian method. After one push only the moved box's dual variable is
+    re-tightened, in O(goals): any feasible dual solution bounds the
+    matching from below, so the cheap update stays admissible. A full
+    re-match is done only when that bound has gone slack (one push can
+    lower the true matching by at most 1).
+    """
+
+    def __init__(self, level):
+        self.level = level
+        # Plain ints: int16 arithmetic could overflow on UNREACHABLE
+        self.dist = [row.tolist() for row in level.push_distances()]
+        self.rematches = 0
+
+    def full(self, box_mask):
+        # (h, duals) where duals = ({box cell: dual}, goal duals, dual sum)
+        boxes = self.level.box_cells(box_mask)
+        if len(boxes) > len(self.dist):
+            # Every box needs a goal of its own: no matching, never solved
+            return UNREACHABLE, ({box: 0 for box in boxes}, [0] * len(self.dist), UNREACHABLE)
+        if not boxes:
+            return 0, ({}, [0] * len(self.dist), 0)
+        self.rematches += 1
+        total, u, v = min_cost_assignment([[dist[box] for dist in self.dist] for box in boxes])
+        return total, (dict(zip(boxes, u)), v, total)
+
+    def update(self, h, duals, box_mask, moved_from, moved_to):
+        # Bound for the child where the box on moved_from went to moved_to
+        box_duals, goal_duals, bound = duals
+        costs = [dist[moved_to] for dist in self.dist]
+        dual = min(c - g for c, g in zip(costs, goal_duals))
+        # The dual sum is the bound; stale goal duals can drive it below 0,
+        # and a negative h would let A*/IDA* take a goal at too low an f and
+        # return a longer than optimal solution. h is clamped at 0, while the
+        # unclamped sum is carried on so later updates stay admissible.
+        child_bound = bound - box_duals[moved_from] + dual
+        child_h = max(child_bound, 0)
+        if child_h < h - 1:
+            return self.full(box_mask)
+        child_duals = dict(box_duals)
+        del child_duals[moved_from]
+        child_duals[moved_to] = dual
+        return child_h, (child_duals, goal_duals, child_bound)
+
+
+class TranspositionTable:
+    """Fixed-size open-addressing table from 64-bit state hashes to depths.
+
+    Keys are kept in an array('Q') and values in a parallel array('I'), so
+    an entry costs 12 bytes however many boxes the level has. A key of 0
+    marks an empty slot. The capacity is the largest power of two that fits
+    max_bytes, and the table never grows. A probe looks at PROBE slots.
+    When none of them is free or holds the key, it overwrites an entry left
+    from an earlier generation, or else the deepest one, if that is deeper
+    than the new entry (shallow entries cut off bigger subtrees). Two states
+    with the same 64-bit hash count as the same state.
+    """
+
+    PROBE = 8
+    ENTRY_BYTES = 12
+
+    def __init__(self, max_bytes=16 * 1024 * 1024):
+        capacity = 1 << max((max_bytes // self.ENTRY_BYTES).bit_length() - 1, 4)
+        self.mask = capacity - 1
+        self.keys = array.array('Q', bytes(8 * capacity))
+        # generation << 16 | depth
+        self.values = array.array('I', bytes(4 * capacity))
+        self.generation = 1
+        self.used = 0
+        self.replaced = 0
+        self.dropped = 0
+
+    def nbytes(self):
+        return self.keys.itemsize * len(self.keys) + self.values.itemsize * len(self.values)
+
+    def new_generation(self):
+        # Entries from earlier generations stay in place but no longer cut
+        # anything, and are the first to be replaced
+        self.generation += 1
+        if self.generation > 0xFFFF:
+            self.keys = array.array('Q', bytes(8 * len(self.keys)))
+            self.values = array.array('I', bytes(4 * len(self.values)))
+            self.generation = 1
+            self.used = 0
+
+    def visit(self, key, depth):
+        # Record the state at depth; False if this generation already reached
+        # it at the same depth or shallower, i.e. it need not be expanded again
+        key = key or 1
+        keys, values, mask = self.keys, self.values, self.mask
+        generation = self.generation
+        victim, victim_depth = -1, depth
+        slot = key & mask
+        for i in range(self.PROBE):
+            s = (slot + i) & mask
+            k = keys[s]
+            if k == key:
+                v = values[s]
+                if v >> 16 == generation and v & 0xFFFF <= depth:
+                    return False
+                values[s] = generation << 16 | depth
+                return True
+            if k == 0:
+                keys[s] = key
+                values[s] = generation << 16 | depth
+                self.used += 1
+                return True
+            v = values[s]
+            stored = 0x10000 if v >> 16 != generation else v & 0xFFFF
+            if stored > victim_depth:
+                victim, victim_depth = s, stored
+        if victim < 0:
+            self.dropped += 1
+        else:
+            keys[victim] = key
+            values[victim] = generation << 16 | depth
+            self.replaced += 1
+        return True
+
+
+def solve_astar(sokoban_pos, boxes, goals, grid, max_nodes=1_000_000):
+    # A* over pushes with the matching heuristic. The heuristic is
+    # admissible, so the first solved state popped has the fewest pushes.
+    # States whose matching is UNREACHABLE can never be solved and are cut.
+    start = usage_snapshot()
+    level = Level(sokoban_pos, boxes, goals, grid)
+    heuristic = MatchingHeuristic(level)
+    deadlocks = DeadlockDetector(level)
+    root = level.pack(level.box_mask, level.normalise(level.player, level.box_mask))
+    h, duals = heuristic.full(level.box_mask)
+    best_g = {root: 0}
+    parents = {root: None}
+    counter = itertools.count()
+    # Ties on f go to the deeper node
+    heap = [(h, 0, next(counter), root, h, duals)] if h < UNREACHABLE else []
+    goal = None
+    while heap and len(best_g) <= max_nodes:
+        _, neg_g, _, state, h, duals = heapq.heappop(heap)
+        g = -neg_g
+        if g > best_g[state]:
+            continue  # stale entry, reached again more cheaply
+        if level.solved(state >> level.cell_bits):
+            goal = state
+            break
+        for box, d, child in level.pushes(state):
+            if g + 1 >= best_g.get(child, UNREACHABLE) or deadlocks.deadlocked(child, level.neighbours[d][box]):
+                continue
+            child_h, child_duals = heuristic.update(h, duals, child >> level.cell_bits, box, level.neighbours[d][box])
+            if child_h >= UNREACHABLE:
+                continue
+            best_g[child] = g + 1
+            parents[child] = (state, box, d)
+            heapq.heappush(heap, (g + 1 + child_h, -(g + 1), next(counter), child, child_h, child_duals))
+
+    if goal is None:
+        status = UNKNOWN if heap else PROVED_UNSOLVABLE
+        return result_dict(level, "native-astar", status, None, len(best_g), start)
+    pushes = []
+    while parents[goal] is not None:
+        goal, box, d = parents[goal]
+        pushes.append((box, d))
+    return result_dict(level, "native-astar", SOLVED, pushes[::-1], len(best_g), start)
+
+
+def solve_idastar(sokoban_pos, boxes, goals, grid, max_nodes=1_000_000, table_bytes=16 * 1024 * 1024):
+    # Iterative deepening A*: depth-first passes bounded by f = g + h, the
+    # bound rising to the smallest f that was cut. Memory is only the current
+    # path plus a fixed-size transposition table, at the price of
+    # re-expanding states; max_nodes counts generated states over all passes.
+    # The table skips a state this pass already reached at the same depth or
+    # shallower (its subtree was searched with at least as much slack);
+    # table_bytes=0 turns it off.
+    start = usage_snapshot()
+    level = Level(sokoban_pos, boxes, goals, grid)
+    heuristic = MatchingHeuristic(level)
+    deadlocks = DeadlockDetector(level)
+    root = level.pack(level.box_mask, level.normalise(level.player, level.box_mask))
+    h, duals = heuristic.full(level.box_mask)
+    if level.solved(level.box_mask):
+        return result_dict(level, "native-idastar", SOLVED, [], 1, start)
+    table = TranspositionTable(table_bytes) if table_bytes else None
+    root_key = level.zobrist(root)
+    nodes = 1
+    threshold = h
+    while threshold < UNREACHABLE and nodes <= max_nodes:
+        next_threshold = UNREACHABLE
+        if table is not None:
+            table.new_generation()
+            table.visit(root_key, 0)
+        stack = [(root, root_key, h, duals, level.pushes(root))]
+        on_path = {root}
+        pushes = []
+        while stack and nodes <= max_nodes:
+            state, key, state_h, state_duals, children = stack[-1]
+            g = len(stack) - 1
+            for box, d, child in children:
+                if child in on_path:
+                    continue
+                nodes += 1
+                child_key = level.zobrist_push(key, state, box, d, child)
+                if table is not None and not table.visit(child_key, g + 1):
+                    continue
+                if deadlocks.deadlocked(child, level.neighbours[d][box]):
+                    continue
+                child_h, child_duals = heuristic.update(state_h, state_duals, child >> level.cell_bits, box, level.neighbours[d][box])
+                if g + 1 + child_h > threshold:
+                    next_threshold = min(next_threshold, g + 1 + child_h)
+                    continue
+                pushes.append((box, d))
+                if level.solved(child >> level.cell_bits):
+                    return result_dict(level, "native-idastar", SOLVED, pushes, nodes, start)
+                on_path.add(child)
+                stack.append((child, child_key, child_h, child_duals, level.pushes(child)))
+                break
+            else:
+                # All children tried: backtrack
+                stack.pop()
+                on_path.discard(state)
+                del pushes[max(len(stack) - 1, 0):]
+        threshold = next_threshold
+
+    status = PROVED_UNSOLVABLE if threshold >= UNREACHABLE and nodes <= max_nodes else UNKNOWN
+    return result_dict(level, "native-idastar", status, None, nodes, start)
+
+
+def benchmark_transpositions(sokoban_pos, boxes, goals, grid, max_nodes=100_000, table_bytes=None):
+    # The same breadth-first push search twice: duplicates detected with a set
+    # of (player, box coordinates) tuples, then with Zobrist hashes in a
+    # TranspositionTable. Returns one dict per method with nodes/sec (pushes
+    # generated and checked) and bytes per stored state. By default the table
+    # is sized for the state count the set run found, at most half full (the
+    # capacity rounds down to a power of two, hence 4x the entries); it
+    # is allocated before the clock starts, and its entry size and load
+    # factor are reported next to bytes per state.
+    level = Level(sokoban_pos, boxes, goals, grid)
+    root = level.pack(level.box_mask, level.normalise(level.player, level.box_mask))
+
+    def as_tuple(state):
+        box_mask, player = level.unpack(state)
+        return level.cells[player], tuple(level.cells[box] for box in level.box_cells(box_mask))
+
+    results = []
+    start = time.perf_counter()
+    seen = {as_tuple(root)}
+    frontier = [root]
+    nodes = 0
+    while frontier and len(seen) < max_nodes:
+        next_frontier = []
+        for state in frontier:
+            for _, _, child in level.pushes(state):
+                nodes += 1
+                key = as_tuple(child)
+                if key not in seen:
+                    seen.add(key)
+                    next_frontier.append(child)
+        frontier = next_frontier
+    elapsed = time.perf_counter() - start
+    # The coordinate pairs are shared with level.cells, so only the two
+    # tuples per state are counted on top of the set itself
+    size = sys.getsizeof(seen) + sum(sys.getsizeof(key) + sys.getsizeof(key[1]) for key in seen)
+    results.append({"method": "set of tuples", "nodes": nodes, "states": len(seen), "elapsed": elapsed,
+                    "nodes_per_sec": nodes / elapsed if elapsed else None, "bytes": size,
+                    "bytes_per_state": size / len(seen)})
+
+    table = TranspositionTable(table_bytes or 4 * len(seen) * TranspositionTable.ENTRY_BYTES)
+    start = time.perf_counter()
+    table.visit(level.zobrist(root), 0)
+    frontier = [(root, level.zobrist(root))]
+    nodes = 0
+    while frontier and table.used < max_nodes:
+        next_frontier = []
+        for state, key in frontier:
+            for box, d, child in level.pushes(state):
+                nodes += 1
+                child_key = level.zobrist_push(key, state, box, d, child)
+                if table.visit(child_key, 0):
+                    next_frontier.append((child, child_key))
+        frontier = next_frontier
+    elapsed = time.perf_counter() - start
+    results.append({"method": "zobrist table", "nodes": nodes, "states": table.used, "elapsed": elapsed,
+                    "nodes_per_sec": nodes / elapsed if elapsed else None, "bytes": table.nbytes(),
+                    "bytes_per_state": table.nbytes() / table.used,
+                    "entry_bytes": TranspositionTable.ENTRY_BYTES, "load": table.used / len(table.keys)})
+    return results
+
+
+# Native engines by name, for run_skoban(native_engine=...)
+SOLVERS = {
+    "bfs": solve_bfs,
+    "astar": solve_astar,
+    "idastar": solve_idastar,
+}
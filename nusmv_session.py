@@ -0,0 +1,423 @@
+import os,queue,re,signal,subprocess,sys,threading,time
+
+
+# Same executable the run_nusmv_and_check helpers call
+NUXMV = r"G:\My Drive\Asaf\Masters and PhD\PhD\Courses\Formal Verification and Synthesis - Hilel Kugler\nuXmv\bin\nuXmv.exe"
+PROMPT = "nuXmv > "
+
+# A verdict line, possibly behind interactive prompts: "-- specification ...
+# is false" or "-- invariant ... is true". Messages such as "-- cannot prove
+# the invariant ... is true or false" are not verdicts.
+VERDICT_LINE = re.compile(r"^(?:\w+ > )*-- (?:specification|invariant) .* is (true|false)\s*$", re.MULTILINE)
+
+
+def find_verdict(output):
+    # "true" or "false" from the first verdict line in output, else None
+    match = VERDICT_LINE.search(output)
+    return match.group(1) if match else None
+
+# Held while a child is reaped and while one is signalled, so kill_process
+# never signals a pid that was already reaped (and may have been reused)
+_reap_lock = threading.Lock()
+
+try:
+    import psutil
+except ImportError:
+    psutil = None  # optional, only needed to sample processes without /proc (Windows)
+
+
+def maxrss_mb(ru_maxrss):
+    # ru_maxrss is in kilobytes on Linux but in bytes on macOS
+    return ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def process_usage(pid):
+    # (user s, sys s, rss MB) of a running process, or None where it cannot be read
+    if psutil is not None:
+        try:
+            proc = psutil.Process(pid)
+            times = proc.cpu_times()
+            return times.user, times.system, proc.memory_info().rss / (1024 * 1024)
+        except psutil.Error:
+            return None
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # Fields after the parenthesised command name; utime/stime are 14/15
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/statm") as f:
+            rss_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    ticks = os.sysconf("SC_CLK_TCK")
+    return int(fields[11]) / ticks, int(fields[12]) / ticks, rss_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+class UsageSampler:
+    """Polls a process on a thread for its CPU times and peak RSS.
+
+    Used where os.wait4 cannot help: long-lived sessions that never exit
+    between models, and platforms without wait4.
+    """
+
+    def __init__(self, pid, interval=0.05):
+        self.pid = pid
+        self.interval = interval
+        self.peak_rss = None
+        self.last = None
+        self._stop = threading.Event()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.sample()
+            self._stop.wait(self.interval)
+
+    def sample(self):
+        usage = process_usage(self.pid)
+        if usage is not None:
+            self.last = usage
+            self.peak_rss = max(self.peak_rss or 0, usage[2])
+        return usage
+
+    def mark(self):
+        # Start a new measuring window: the peak restarts from the current RSS
+        usage = self.sample()
+        self.peak_rss = usage[2] if usage else None
+        return usage
+
+    def since(self, mark):
+        # Usage dict for the window opened by mark()
+        usage = self.sample() or self.last
+        if mark is None or usage is None:
+            return {"user": None, "sys": None, "max_rss_mb": self.peak_rss}
+        return {"user": usage[0] - mark[0], "sys": usage[1] - mark[1], "max_rss_mb": self.peak_rss}
+
+    def stop(self):
+        self._stop.set()
+
+
+def kill_process(proc):
+    # Popen.kill() polls first and may reap the child, which would leave
+    # nothing for os.wait4; signal it directly where wait4 is used. A child
+    # reap() has already collected has its returncode set and is left alone.
+    if hasattr(os, "wait4"):
+        with _reap_lock:
+            if proc.returncode is not None:
+                return
+            try:
+                os.kill(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+    else:
+        proc.kill()
+
+
+def reap(proc, sampler=None):
+    # Wait for a child and return its usage as {"user", "sys", "max_rss_mb"}.
+    # os.wait4 gives the kernel's exact figures; elsewhere the sampler's
+    # last reading is the best there is.
+    if hasattr(os, "wait4") and proc.returncode is None:
+        if hasattr(os, "waitid"):
+            # Wait for the exit without reaping: the pid stays taken until
+            # wait4 below, which then finds it at once
+            os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOWAIT)
+        while True:
+            # Never block inside the lock, kill_process needs it: without
+            # waitid (macOS before 3.13) this polls until the child exits
+            with _reap_lock:
+                pid, status, ru = os.wait4(proc.pid, os.WNOHANG)
+                if pid:
+                    proc.returncode = os.waitstatus_to_exitcode(status)
+                    break
+            time.sleep(0.01)
+        if sampler is not None:
+            sampler.stop()
+        return {"user": ru.ru_utime, "sys": ru.ru_stime, "max_rss_mb": maxrss_mb(ru.ru_maxrss)}
+    proc.wait()
+    if sampler is None:
+        return {"user": None, "sys": None, "max_rss_mb": None}
+    sampler.stop()
+    return sampler.since((0.0, 0.0, 0.0))
+
+
+def run_measured(args, commands, timeout=60, started=None):
+    # subprocess.run() for one nuXmv invocation, plus the OS resource usage
+    # of the child. started(proc) is called right after the process starts
+    # (run_portfolio uses it to be able to kill losers).
+    # Returns (stdout, stderr, usage).
+    proc = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    sampler = None if hasattr(os, "wait4") else UsageSampler(proc.pid)
+    if started is not None:
+        started(proc)
+    out, err = [], []
+    pumps = [threading.Thread(target=NuSMVSession._pump, args=(proc.stdout, out.append), daemon=True),
+             threading.Thread(target=NuSMVSession._pump, args=(proc.stderr, err.append), daemon=True)]
+    for pump in pumps:
+        pump.start()
+    timed_out = threading.Event()
+
+    def expire():
+        timed_out.set()
+        kill_process(proc)
+
+    timer = threading.Timer(timeout, expire)
+    timer.start()
+    try:
+        try:
+            proc.stdin.write(commands.encode("utf-8"))
+            proc.stdin.close()
+        except OSError:
+            pass  # exited early, its output says why
+        usage = reap(proc, sampler)
+    finally:
+        timer.cancel()
+    for pump in pumps:
+        pump.join()
+    stdout = b"".join(c for c in out if c).decode("utf-8")
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(args, timeout, output=stdout)
+    return stdout, b"".join(c for c in err if c).decode("utf-8"), usage
+
+
+
+class NuSMVSession:
+    """One long-lived `nuXmv -int` process driven over stdin/stdout."""
+
+    def __init__(self, nuxmv=NUXMV, prompt=PROMPT):
+        self.nuxmv = nuxmv
+        self.prompt = prompt
+        self.proc = None
+        self.models = 0
+        self.sampler = None
+        self.last_usage = None
+
+    def start(self):
+        self.proc = subprocess.Popen(
+            [self.nuxmv, "-int"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        # Pipes are read on threads so a missing prompt can time out
+        # (select() does not work on pipes under Windows)
+        self._out = queue.Queue()
+        self._err = []
+        threading.Thread(target=self._pump, args=(self.proc.stdout, self._out.put), daemon=True).start()
+        threading.Thread(target=self._pump, args=(self.proc.stderr, self._err.append), daemon=True).start()
+        # The process lives on between models, so its usage is sampled
+        self.sampler = UsageSampler(self.proc.pid)
+        # Swallow the banner up to the first prompt
+        self._read_until_prompt(timeout=60)
+        self.models = 0
+
+    @staticmethod
+    def _pump(pipe, sink):
+        while True:
+            chunk = pipe.read1(4096)
+            if not chunk:
+                sink(None)
+                return
+            sink(chunk)
+
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def _read_until_prompt(self, timeout):
+        deadline = time.perf_counter() + timeout
+        buf = b""
+        prompt = self.prompt.encode("utf-8")
+        while not buf.endswith(prompt):
+            try:
+                chunk = self._out.get(timeout=max(deadline - time.perf_counter(), 0))
+            except queue.Empty:
+                self.kill()
+                raise subprocess.TimeoutExpired(self.nuxmv, timeout, output=buf)
+            if chunk is None:
+                raise subprocess.CalledProcessError(self.proc.wait(), self.nuxmv, output=buf)
+            buf += chunk
+        return buf[:-len(prompt)].decode("utf-8")
+
+    def _drain_stderr(self):
+        chunks, self._err[:] = self._err[:], []
+        return b"".join(c for c in chunks if c).decode("utf-8")
+
+    def command(self, cmd, timeout=60):
+        # Send one command and return (stdout, stderr) printed before the next prompt
+        self.proc.stdin.write((cmd + "\n").encode("utf-8"))
+        self.proc.stdin.flush()
+        output = self._read_until_prompt(timeout)
+        return output, self._drain_stderr()
+
+    def run(self, commands, timeout=60):
+        # Run a command list against one model, then `reset` for the next one.
+        # The timeout covers the whole list, as with subprocess.run.
+        # The usage of this model is left in last_usage.
+        deadline = time.perf_counter() + timeout
+        output, error_output = [], []
+        mark = self.sampler.mark()
+        for cmd in list(commands) + ["reset"]:
+            out, err = self.command(cmd, timeout=max(deadline - time.perf_counter(), 0))
+            output.append(out)
+            error_output.append(err)
+        self.last_usage = self.sampler.since(mark)
+        self.models += 1
+        return "".join(output), "".join(error_output)
+
+    def kill(self):
+        if self.sampler is not None:
+            self.sampler.stop()
+        if self.alive():
+            self.proc.kill()
+            self.proc.wait()
+
+    def close(self):
+        if self.sampler is not None:
+            self.sampler.stop()
+        if self.alive():
+            try:
+                self.proc.stdin.write(b"quit\n")
+                self.proc.stdin.flush()
+                self.proc.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self.kill()
+
+
+class SessionPool:
+    """Keeps up to `size` NuSMVSession processes alive and hands them out."""
+
+    def __init__(self, size=1, nuxmv=NUXMV, max_models=None):
+        self.nuxmv = nuxmv
+        # Optionally restart a session after this many models, in case
+        # nuXmv leaks memory across `reset`
+        self.max_models = max_models
+        self._idle = queue.Queue()
+        for _ in range(size):
+            self._idle.put(None)
+
+    def acquire(self):
+        session = self._idle.get()
+        if session is None or not session.alive():
+            session = NuSMVSession(self.nuxmv)
+            try:
+                session.start()
+            except Exception:
+                self._idle.put(None)
+                raise
+        return session
+
+    def release(self, session):
+        if not session.alive() or (self.max_models and session.models >= self.max_models):
+            session.close()
+            session = None
+        self._idle.put(session)
+
+    def run(self, filename, commands, timeout=60):
+        # The session outlives the file, so read_model is told which one (quoted:
+        # paths like the default out_dir contain spaces)
+        commands = [f'read_model -i "{filename}"' if cmd == "read_model" else cmd for cmd in commands]
+        session = self.acquire()
+        try:
+            output, error_output = session.run(commands, timeout=timeout)
+            return output, error_output, session.last_usage
+        except (subprocess.TimeoutExpired, subprocess.CalledProcessError, OSError):
+            # Crashed or hung: drop the process, the next acquire restarts it
+            session.kill()
+            raise
+        finally:
+            self.release(session)
+
+    def close(self):
+        while not self._idle.empty():
+            session = self._idle.get()
+            if session is not None:
+                session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class VerdictReader:
+    """Parses nuXmv output line by line and spots the verdict as it arrives."""
+
+    # Lines that belong to a counterexample trace
+    TRACE_PREFIXES = ("-- as demonstrated", "Trace Description", "Trace Type", "->", "-- Loop starts here")
+
+    def __init__(self, keep_trace=True):
+        self.keep_trace = keep_trace
+        self.lines = []
+        self.verdict = None  # "is false" / "is true" once seen
+        self.in_trace = False
+        self.done = False
+
+    def feed(self, line):
+        # Returns True once the verdict, and its trace when kept, is complete
+        prompt = line.startswith(PROMPT.strip())
+        text = line.strip()
+        while text.startswith(PROMPT.strip()):
+            text = text[len(PROMPT.strip()):].strip()
+        if self.in_trace:
+            # The trace runs until the next prompt or non-trace line
+            if not prompt and (not text or text.startswith(self.TRACE_PREFIXES) or (line[:1].isspace() and " = " in text)):
+                if text:
+                    self.lines.append(text)
+                return False
+            # First line past the trace
+            self.in_trace = False
+            self.done = True
+        # Banner and bare prompts are dropped, the rest is kept for the log
+        if text and not text.startswith("***"):
+            self.lines.append(text)
+        found = find_verdict(text) if self.verdict is None else None
+        if found is not None:
+            self.verdict = "is " + found
+            # Only a false spec comes with a trace to wait for
+            self.in_trace = self.keep_trace and self.verdict == "is false"
+            self.done = not self.in_trace
+        return self.done
+
+    def close(self):
+        # End of output: a trace still being read is complete
+        self.in_trace = False
+        self.done = self.verdict is not None
+
+    def output(self):
+        return "\n".join(self.lines) + "\n"
+
+
+def run_streaming(args, commands, timeout=60, stop_early=True, keep_trace=True):
+    # Run a one-shot nuXmv process, parsing stdout as it arrives instead of
+    # buffering it. With stop_early the process is killed as soon as the
+    # verdict (and its trace) has been read. Returns (output, stderr, usage)
+    # where output is the VerdictReader's compact log.
+    proc = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    sampler = None if hasattr(os, "wait4") else UsageSampler(proc.pid)
+    errors = []
+    threading.Thread(target=NuSMVSession._pump, args=(proc.stderr, errors.append), daemon=True).start()
+    timed_out = threading.Event()
+
+    def expire():
+        timed_out.set()
+        kill_process(proc)
+
+    timer = threading.Timer(timeout, expire)
+    timer.start()
+    reader = VerdictReader(keep_trace=keep_trace)
+    try:
+        proc.stdin.write(commands.encode("utf-8"))
+        proc.stdin.close()
+        for raw in proc.stdout:
+            if reader.feed(raw.decode("utf-8")) and stop_early:
+                break
+        else:
+            reader.close()
+    finally:
+        timer.cancel()
+        # Killing an already finished process is harmless
+        kill_process(proc)
+        usage = reap(proc, sampler)
+    if timed_out.is_set() and not reader.done:
+        raise subprocess.TimeoutExpired(args, timeout, output=reader.output())
+    return reader.output(), b"".join(c for c in errors if c).decode("utf-8"), usage
@@ -0,0 +1,83 @@
+import array,collections,hashlib,threading
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  # tables fall back to one array('h') row per goal
+
+
+# Push distance of a box that can never reach the goal: fits an int16 and
+# is larger than any real distance
+UNREACHABLE = 32767
+
+# Tables already computed, by board_hash, least recently used first. A
+# batch run sees each board once or twice, so only the last few are kept.
+MAX_TABLES = 32
+_tables = collections.OrderedDict()
+_lock = threading.Lock()
+
+
+def board_hash(cells, goals):
+    # The numbered floor cells fix the neighbour tables, so they and the goal
+    # cells identify a table (the same board compiled the same way again)
+    blob = repr((list(cells), list(goals)))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def pull_distances(neighbours, num_cells, goal):
+    # Reverse pull BFS from one goal: fewest pushes that bring a box from each
+    # cell onto the goal on an otherwise empty board. Pulling the box from
+    # cell back to prev needs the cell beyond prev free for the player too.
+    dist = array.array('h', [UNREACHABLE]) * num_cells
+    dist[goal] = 0
+    queue = collections.deque([goal])
+    while queue:
+        cell = queue.popleft()
+        for step in neighbours:
+            prev = step[cell]
+            if prev < 0 or dist[prev] != UNREACHABLE or step[prev] < 0:
+                continue
+            dist[prev] = dist[cell] + 1
+            queue.append(prev)
+    return dist
+
+
+def push_distance_table(cells, neighbours, goals):
+    # Dense goals x cells int16 matrix: table[g][cell] is the push distance
+    # from cell to the g-th goal. neighbours holds one step table per
+    # direction (cell -> next cell or -1), goals are cell numbers. Tables are
+    # cached per board hash, so the per-box models of the iterative solver
+    # and repeated runs on a board compute it once.
+    key = board_hash(cells, goals)
+    with _lock:
+        table = _tables.get(key)
+        if table is not None:
+            _tables.move_to_end(key)
+            return table
+    neighbours = list(neighbours)
+    rows = [pull_distances(neighbours, len(cells), goal) for goal in goals]
+    if numpy is not None:
+        table = numpy.array(rows, dtype=numpy.int16).reshape(len(goals), len(cells))
+        table.flags.writeable = False  # shared through the cache
+    else:
+        table = rows
+    with _lock:
+        table = _tables.setdefault(key, table)
+        _tables.move_to_end(key)
+        while len(_tables) > MAX_TABLES:
+            _tables.popitem(last=False)
+        return table
+
+
+def min_distances(table, num_cells):
+    # Push distance from each cell to its nearest goal, as a list of ints
+    if not len(table):
+        return [UNREACHABLE] * num_cells
+    if numpy is not None:
+        return table.min(axis=0).tolist()
+    return [min(column) for column in zip(*table)]
+
+
+def clear_push_tables():
+    with _lock:
+        _tables.clear()
@@ -0,0 +1,84 @@
+import hashlib,json,os,threading
+
+
+class ResultCache:
+    """Solver results on disk, keyed by board, encoding, engine and bound.
+
+    Each entry is one JSON file named after the SHA-256 of its key. A hit
+    touches the file, and once the directory grows past max_bytes the least
+    recently used entries are deleted.
+    """
+
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def normalise_board(board):
+        # Trailing blanks and empty rows do not change the level; leading
+        # ones do shift the coordinates, so they stay
+        rows = [row.rstrip() for row in board]
+        while rows and not rows[-1]:
+            rows.pop()
+        return rows
+
+    def key(self, board, options, engine, bound):
+        blob = json.dumps({
+            "board": self.normalise_board(board),
+            "options": options or {},
+            "engine": engine,
+            "bound": bound,
+        }, sort_keys=True)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, board, options, engine, bound):
+        path = self.path(self.key(board, options, engine, bound))
+        with self.lock:
+            try:
+                with open(path) as f:
+                    stats = json.load(f)
+                os.utime(path)
+            except FileNotFoundError:
+                return None
+            except ValueError:
+                # Half-written or corrupt entry: drop it and run again
+                os.remove(path)
+                return None
+        stats["cached"] = True
+        return stats
+
+    def put(self, board, options, engine, bound, stats):
+        # The verdict, solution and timings are kept; raw solver output is not
+        entry = {k: v for k, v in stats.items() if k not in ("stdout", "stderr", "trace", "cached")}
+        if stats.get("trace") is not None:
+            entry["trace_boxes"] = list(stats["trace"].boxes)
+        path = self.path(self.key(board, options, engine, bound))
+        with self.lock:
+            with open(path + ".tmp", "w") as f:
+                json.dump(entry, f)
+            os.replace(path + ".tmp", path)
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                st = os.stat(os.path.join(self.directory, name))
+                entries.append((st.st_mtime, st.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+
+    def clear(self):
+        with self.lock:
+            for name in os.listdir(self.directory):
+                if name.endswith(".json"):
+                    os.remove(os.path.join(self.directory, name))
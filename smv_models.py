@@ -0,0 +1,480 @@
+import collections,functools,io
+from push_tables import UNREACHABLE, min_distances, push_distance_table
+
+
+# Cell flags stored in BoardGrid.cells
+WALL = 1
+GOAL = 2
+BOX = 4
+
+
+class BoardGrid:
+    """Occupancy grid of a parsed board, one flag byte per cell.
+
+    Coordinates are 1-based (c, r) like the generated model, so lookups are
+    O(1) instead of scanning the wall/goal/box lists.
+    """
+
+    def __init__(self, rows, cols):
+        self.rows = rows
+        self.cols = cols
+        self.cells = bytearray(rows * cols)
+
+    def index(self, c, r):
+        return (r - 1) * self.cols + (c - 1)
+
+    def set(self, c, r, flag):
+        self.cells[self.index(c, r)] |= flag
+
+    def has(self, c, r, flag):
+        if not (1 <= c <= self.cols and 1 <= r <= self.rows):
+            return False
+        return bool(self.cells[self.index(c, r)] & flag)
+
+    def is_wall(self, c, r):
+        return self.has(c, r, WALL)
+
+    def is_goal(self, c, r):
+        return self.has(c, r, GOAL)
+
+    def is_box(self, c, r):
+        return self.has(c, r, BOX)
+
+
+def parse_board(board):
+    sokoban_pos = None
+    boxes = []
+    goals = []
+    rows = len(board)
+    cols = max((len(row) for row in board), default=0)
+    grid = BoardGrid(rows, cols)
+
+    for r, row in enumerate(board):
+        for c, cell in enumerate(row):
+            if cell == '@' or cell == '+':
+                sokoban_pos = (c + 1, r + 1)  # +1 to convert to 1-based indexing
+            if cell == '$' or cell == '*':
+                boxes.append((c + 1, r + 1))
+                grid.set(c + 1, r + 1, BOX)
+            if cell == '.' or cell == '*' or cell == '+':
+                goals.append((c + 1, r + 1))
+                grid.set(c + 1, r + 1, GOAL)
+            if cell == '#':
+                grid.set(c + 1, r + 1, WALL)
+
+    return sokoban_pos, boxes, goals, grid
+
+
+# (move, column step, row step, suffix of the box_{i}_on_* defines)
+MOVE_STEPS = [
+    ('r', 1, 0, 'r'),
+    ('l', -1, 0, 'l'),
+    ('u', 0, -1, 't'),
+    ('d', 0, 1, 'b')
+]
+
+
+def wall_ahead_cells(grid, dc, dr, dist):
+    # Floor cells whose neighbour `dist` steps along (dc, dr) is a wall or
+    # lies off the board, i.e. where the player (dist=1) or a pushed box
+    # (dist=2) cannot go in that direction
+    cells = []
+    for r in range(1, grid.rows + 1):
+        for c in range(1, grid.cols + 1):
+            if grid.is_wall(c, r):
+                continue
+            tc, tr = c + dc * dist, r + dr * dist
+            if not (1 <= tc <= grid.cols and 1 <= tr <= grid.rows) or grid.is_wall(tc, tr):
+                cells.append((c, r))
+    return cells
+
+
+class CompiledBoard:
+    """Floor cells of a board numbered 0..N-1, with neighbour tables.
+
+    cells[i] is the (c, r) of floor cell i and index_of[grid.index(c, r)] is
+    its number, or -1 for walls and cells outside the level.
+    neighbours[move][i] is the cell one step from i in that direction and
+    neighbours2[move][i] the cell two steps away, or -1 where a wall is hit.
+    """
+
+    def __init__(self, grid, cells):
+        self.grid = grid
+        self.cells = cells
+        self.index_of = [-1] * (grid.rows * grid.cols)
+        for i, (c, r) in enumerate(cells):
+            self.index_of[grid.index(c, r)] = i
+        self.neighbours = {}
+        self.neighbours2 = {}
+        for move_dir, dc, dr, _ in MOVE_STEPS:
+            step = [self.cell(c + dc, r + dr) for c, r in cells]
+            self.neighbours[move_dir] = step
+            self.neighbours2[move_dir] = [step[n] if n >= 0 else -1 for n in step]
+
+    def __len__(self):
+        return len(self.cells)
+
+    def cell(self, c, r):
+        if not (1 <= c <= self.grid.cols and 1 <= r <= self.grid.rows):
+            return -1
+        return self.index_of[self.grid.index(c, r)]
+
+
+def compile_board(grid, sokoban_pos, boxes):
+    # Flood-fill the floor from the player (and from every box, so a box in
+    # a sealed-off pocket still gets a cell) and number the cells in BFS order.
+    # Walls and the space outside the level never get a number.
+    seen = set()
+    cells = []
+    queue = collections.deque()
+    for pos in [sokoban_pos] + list(boxes):
+        if pos not in seen:
+            seen.add(pos)
+            queue.append(pos)
+    while queue:
+        c, r = queue.popleft()
+        cells.append((c, r))
+        for _, dc, dr, _ in MOVE_STEPS:
+            nxt = (c + dc, r + dr)
+            if nxt in seen or grid.is_wall(*nxt):
+                continue
+            if not (1 <= nxt[0] <= grid.cols and 1 <= nxt[1] <= grid.rows):
+                continue
+            seen.add(nxt)
+            queue.append(nxt)
+    return CompiledBoard(grid, cells)
+
+
+def goal_distances(compiled, goals):
+    # Push distances from every floor cell to every goal, a goals x cells
+    # int16 table from push_tables (cached per board, so each model of the
+    # same board reuses it)
+    goal_cells = [cell for cell in dict.fromkeys(compiled.cell(*goal) for goal in goals) if cell >= 0]
+    return push_distance_table(compiled.cells, compiled.neighbours.values(), goal_cells)
+
+
+def dead_cells(compiled, goals):
+    # Simple deadlock squares: floor cells from which a box can never be
+    # pushed onto any goal, i.e. with no push distance to any of them
+    nearest = min_distances(goal_distances(compiled, goals), len(compiled))
+    return [cell for cell in range(len(compiled)) if nearest[cell] == UNREACHABLE]
+
+
+def smv_emitter(generate):
+    # Generators write each model section straight to `out` (an open file or
+    # pipe) as it is produced, so memory stays flat however big the board is.
+    # Without `out` the model text is collected and returned as before.
+    @functools.wraps(generate)
+    def emit(*args, out=None, **kwargs):
+        if out is not None:
+            generate(*args, out=out, **kwargs)
+            return None
+        buf = io.StringIO()
+        generate(*args, out=buf, **kwargs)
+        return buf.getvalue()
+    return emit
+
+
+@smv_emitter
+def generate_cell_smv_model(board, sokoban_pos, boxes, goals, grid, target_box=None, const_goals=False, move_ivar=False, prune_dead=False, box_bitmap=False, occupancy=False, invar_spec=False, out=None):
+    # Same game as generate_smv_model, but every position is a single
+    # 0..N-1 variable over the reachable floor cells of compile_board, and
+    # all moves go through precomputed neighbour tables. There are no
+    # coordinate guards and no array subscripts that can run off the board.
+    #
+    # With box_bitmap the boxes are not numbered at all: box[k] says whether
+    # floor cell k holds a box. Identical boxes then have a single state per
+    # configuration instead of one per permutation of box_1..box_n.
+    #
+    # With occupancy the per-box variables stay, but mv_*, push_* and win
+    # go through one occ_k define per cell instead of comparing every pair
+    # of boxes and every box with every goal, so the model grows linearly
+    # with the number of boxes.
+    if box_bitmap and target_box is not None:
+        raise ValueError("box_bitmap boxes are interchangeable, target_box cannot single one out")
+    compiled = compile_board(grid, sokoban_pos, boxes)
+    last = len(compiled) - 1
+    man_cell = compiled.cell(*sokoban_pos)
+    box_cells = [compiled.cell(*box) for box in boxes]
+    # A goal outside the floor region can never be reached by a box
+    goal_cells = [compiled.cell(*goal) for goal in goals if compiled.cell(*goal) >= 0]
+
+    out.write("MODULE main\n")
+    if move_ivar:
+        out.write("IVAR\n")
+        out.write(f"    move : {{l,u,r,d}};\n")
+        out.write("VAR\n")
+    else:
+        out.write("VAR\n")
+        out.write(f"    move : {{l,u,r,d}};\n")
+    out.write(f"    man : 0..{last};\n")
+    if box_bitmap:
+        out.write(f"    box : array 0..{last} of boolean;\n")
+    else:
+        for i in range(len(boxes)):
+            out.write(f"    box_{i + 1} : 0..{last};\n")
+        if not const_goals:
+            for j in range(len(goal_cells)):
+                out.write(f"    goal_{j + 1} : 0..{last};\n")
+
+    out.write("ASSIGN\n")
+    out.write(f"    init(man) := {man_cell};\n")
+    if box_bitmap:
+        for cell in range(len(compiled)):
+            out.write(f"    init(box[{cell}]) := {'TRUE' if cell in box_cells else 'FALSE'};\n")
+    else:
+        for i, cell in enumerate(box_cells):
+            out.write(f"    init(box_{i + 1}) := {cell};\n")
+        if not const_goals:
+            for j, cell in enumerate(goal_cells):
+                out.write(f"    goal_{j + 1} := {cell};\n")
+
+    out.write("next(man) :=\n")
+    out.write("    case\n")
+    for move_dir, _, _, suffix in MOVE_STEPS:
+        out.write(f"        mv_{move_dir} | push_{move_dir} : nb_{suffix};\n")
+    out.write("        TRUE : man;\n")
+    out.write("    esac;\n")
+
+    if box_bitmap:
+        # A push empties the cell next to the player and fills the one after
+        # it; the player cells that do that to cell k are known up front
+        for cell in range(len(compiled)):
+            out.write(f"next(box[{cell}]) :=\n")
+            out.write("    case\n")
+            for move_dir, _, _, _ in MOVE_STEPS:
+                for man, target in enumerate(compiled.neighbours[move_dir]):
+                    if target == cell:
+                        out.write(f"        push_{move_dir} & man = {man} : FALSE;\n")
+                for man, target in enumerate(compiled.neighbours2[move_dir]):
+                    if target == cell:
+                        out.write(f"        push_{move_dir} & man = {man} : TRUE;\n")
+            out.write(f"        TRUE : box[{cell}];\n")
+            out.write("    esac;\n")
+    else:
+        for i in range(len(boxes)):
+            out.write(f"next(box_{i + 1}) :=\n")
+            out.write("    case\n")
+            for move_dir, _, _, suffix in MOVE_STEPS:
+                out.write(f"        push_{move_dir} & box_{i + 1}_on_{suffix} : nb_{suffix}p1;\n")
+            out.write(f"        TRUE : box_{i + 1};\n")
+            out.write("    esac;\n")
+
+    out.write("DEFINE\n")
+    if const_goals and not box_bitmap:
+        for j, cell in enumerate(goal_cells):
+            out.write(f"    goal_{j + 1} := {cell};\n")
+
+    # Neighbour tables: the cell one (nb_*) and two (nb_*p1) steps from the
+    # player, and which player cells have a wall there instead
+    for move_dir, _, _, suffix in MOVE_STEPS:
+        for name, table in ((suffix, compiled.neighbours[move_dir]),
+                            (f"{suffix}p1", compiled.neighbours2[move_dir])):
+            if any(target >= 0 for target in table):
+                out.write(f"    nb_{name} :=\n")
+                out.write("        case\n")
+                for cell, target in enumerate(table):
+                    if target >= 0:
+                        out.write(f"            man = {cell} : {target};\n")
+                out.write("            TRUE : man;\n")
+                out.write("        esac;\n")
+            else:
+                out.write(f"    nb_{name} := man;\n")
+            blocked = ", ".join(str(cell) for cell, target in enumerate(table) if target < 0)
+            out.write(f"    wall_on_{name} := {f'man in {{{blocked}}}' if blocked else 'FALSE'};\n")
+
+    if occupancy and not box_bitmap:
+        # Per-cell occupancy, derived once from the box variables, and the
+        # occupancy of the cells one and two steps from the player
+        for cell in range(len(compiled)):
+            taken = " | ".join(f"box_{i + 1} = {cell}" for i in range(len(boxes)))
+            out.write(f"    occ_{cell} := {taken or 'FALSE'};\n")
+        for move_dir, _, _, suffix in MOVE_STEPS:
+            for name, table in ((suffix, compiled.neighbours[move_dir]),
+                                (f"{suffix}p1", compiled.neighbours2[move_dir])):
+                out.write(f"    occ_nb_{name} :=\n")
+                out.write("        case\n")
+                for cell, target in enumerate(table):
+                    if target >= 0:
+                        out.write(f"            man = {cell} : occ_{target};\n")
+                out.write("            TRUE : FALSE;\n")
+                out.write("        esac;\n")
+
+        # Which box a push moves, for next(box_i)
+        for i in range(len(boxes)):
+            for _, _, _, suffix in MOVE_STEPS:
+                out.write(f"    box_{i + 1}_on_{suffix} := box_{i + 1} = nb_{suffix};\n")
+
+    if box_bitmap or occupancy:
+        # Define mv_* and push conditions on the occupancy of the cells ahead
+        occupied = "box[nb_{}]" if box_bitmap else "occ_nb_{}"
+        for move_dir, _, _, suffix in MOVE_STEPS:
+            out.write(f"    mv_{move_dir} := (move = {move_dir}) & !wall_on_{suffix} & !{occupied.format(suffix)};\n")
+        for move_dir, _, _, suffix in MOVE_STEPS:
+            out.write(f"    push_{move_dir} := (move = {move_dir}) & !wall_on_{suffix}p1"
+                      f" & {occupied.format(suffix)} & !{occupied.format(suffix + 'p1')};\n")
+    else:
+        # Define mv_* conditions
+        for move_dir, _, _, suffix in MOVE_STEPS:
+            out.write(f"    mv_{move_dir} := (move = {move_dir}) & !wall_on_{suffix}")
+            for i in range(len(boxes)):
+                out.write(f" & !box_{i+1}_on_{suffix}")
+            out.write(";\n")
+
+        # Define box positions
+        for i in range(len(boxes)):
+            for _, _, _, suffix in MOVE_STEPS:
+                out.write(f"    box_{i + 1}_on_{suffix} := box_{i + 1} = nb_{suffix};\n")
+                out.write(f"    box_{i + 1}_on_{suffix}p1 := !wall_on_{suffix}p1 & box_{i + 1} = nb_{suffix}p1;\n")
+
+        # Define push conditions
+        for move_dir, _, _, suffix in MOVE_STEPS:
+            out.write(f"    push_{move_dir} := (move = {move_dir}) & !wall_on_{suffix}p1 & (")
+            if not boxes:
+                out.write("FALSE")
+            for i in range(len(boxes)):
+                out.write(f"(box_{i+1}_on_{suffix}")
+                for j in range(len(boxes)):
+                    if j != i:
+                        out.write(f" & !box_{j+1}_on_{suffix}p1")
+                out.write(")")
+                if i < len(boxes) - 1:
+                    out.write(" | ")
+            out.write(");\n")
+
+    # Win condition
+    out.write("    win := ")
+    targets = range(len(boxes)) if target_box is None else [target_box - 1]
+    if box_bitmap or (occupancy and target_box is None):
+        # Every box is on a goal <=> every goal is covered (as many boxes as
+        # goals) or no box is left on a non-goal cell (any other count)
+        occupied = "box[{}]" if box_bitmap else "occ_{}"
+        if len(boxes) == len(goal_cells):
+            terms = [occupied.format(cell) for cell in goal_cells]
+        else:
+            terms = [f"!{occupied.format(cell)}" for cell in range(len(compiled)) if cell not in goal_cells]
+        out.write(" & ".join(terms) or "TRUE")
+        out.write(";\n")
+    elif occupancy:
+        cells = ", ".join(str(cell) for cell in goal_cells)
+        out.write(f"box_{target_box} in {{{cells}}};\n" if cells else "FALSE;\n")
+    else:
+        terms = []
+        for i in targets:
+            on_goal = " | ".join(f"box_{i + 1} = goal_{j + 1}" for j in range(len(goal_cells)))
+            terms.append(f"({on_goal or 'FALSE'})")
+        out.write(" & ".join(terms) or "TRUE")
+        out.write(";\n")
+    if prune_dead:
+        # A box that has to reach a goal may never enter a dead square
+        dead = dead_cells(compiled, goals)
+        if box_bitmap:
+            for cell in dead:
+                out.write(f"INVAR !box[{cell}];\n")
+        elif dead:
+            dead = ", ".join(str(cell) for cell in dead)
+            for i in targets:
+                out.write(f"INVAR !(box_{i + 1} in {{{dead}}});\n")
+    if invar_spec:
+        # Plain reachability for the invariant engines (no LTL loop-backs)
+        out.write("INVARSPEC !win;\n")
+    out.write("LTLSPEC !F win;\n")
+
+
+@smv_emitter
+def generate_push_smv_model(board, sokoban_pos, boxes, goals, grid, target_box=None, prune_dead=False, reach_depth=None, invar_spec=False, out=None):
+    # Push-level model: one transition is one box push, so the BMC bound
+    # counts pushes instead of single steps. The inputs pick the box cell
+    # (at) and the direction (move); the push is legal when the player can
+    # walk to the cell behind that box. That walk is a flood fill over the
+    # floor unrolled reach_depth times in DEFINEs (reach_t_k: cell k is
+    # reachable in t steps without crossing a box). The default depth is
+    # exact; a smaller one only misses pushes, never invents them.
+    if target_box is not None:
+        raise ValueError("the push-level model uses a box bitmap, target_box cannot single one out")
+    compiled = compile_board(grid, sokoban_pos, boxes)
+    last = len(compiled) - 1
+    man_cell = compiled.cell(*sokoban_pos)
+    box_cells = [compiled.cell(*box) for box in boxes]
+    goal_cells = [compiled.cell(*goal) for goal in goals if compiled.cell(*goal) >= 0]
+    if reach_depth is None:
+        # A walk never needs more steps than there are free cells
+        reach_depth = max(len(compiled) - len(boxes) - 1, 0)
+    opposite = {'r': 'l', 'l': 'r', 'u': 'd', 'd': 'u'}
+
+    out.write("MODULE main\n")
+    out.write("IVAR\n")
+    out.write(f"    at : 0..{last};\n")
+    out.write(f"    move : {{l,u,r,d}};\n")
+    out.write("VAR\n")
+    out.write(f"    man : 0..{last};\n")
+    out.write(f"    box : array 0..{last} of boolean;\n")
+
+    out.write("ASSIGN\n")
+    out.write(f"    init(man) := {man_cell};\n")
+    for cell in range(len(compiled)):
+        out.write(f"    init(box[{cell}]) := {'TRUE' if cell in box_cells else 'FALSE'};\n")
+
+    # After a push the player stands where the box was
+    out.write("next(man) :=\n")
+    out.write("    case\n")
+    out.write("        pushing : at;\n")
+    out.write("        TRUE : man;\n")
+    out.write("    esac;\n")
+
+    for cell in range(len(compiled)):
+        out.write(f"next(box[{cell}]) :=\n")
+        out.write("    case\n")
+        out.write(f"        pushing & at = {cell} : FALSE;\n")
+        for move_dir, _, _, _ in MOVE_STEPS:
+            source = compiled.neighbours[opposite[move_dir]][cell]
+            if source >= 0:
+                out.write(f"        pushing & at = {source} & move = {move_dir} : TRUE;\n")
+        out.write(f"        TRUE : box[{cell}];\n")
+        out.write("    esac;\n")
+
+    out.write("DEFINE\n")
+    # Player flood fill around the boxes
+    for cell in range(len(compiled)):
+        out.write(f"    reach_0_{cell} := man = {cell};\n")
+    for step in range(1, reach_depth + 1):
+        for cell in range(len(compiled)):
+            around = [compiled.neighbours[move_dir][cell] for move_dir, _, _, _ in MOVE_STEPS]
+            around = " | ".join(f"reach_{step - 1}_{n}" for n in around if n >= 0)
+            if around:
+                out.write(f"    reach_{step}_{cell} := reach_{step - 1}_{cell} | !box[{cell}] & ({around});\n")
+            else:
+                out.write(f"    reach_{step}_{cell} := reach_{step - 1}_{cell};\n")
+
+    # push_k_d: the box on cell k can be pushed one cell in direction d
+    legal = []
+    for cell in range(len(compiled)):
+        for move_dir, _, _, _ in MOVE_STEPS:
+            behind = compiled.neighbours[opposite[move_dir]][cell]
+            ahead = compiled.neighbours[move_dir][cell]
+            if behind < 0 or ahead < 0:
+                continue
+            out.write(f"    push_{cell}_{move_dir} := box[{cell}] & !box[{ahead}] & reach_{reach_depth}_{behind};\n")
+            legal.append((cell, move_dir))
+    out.write("    pushing :=\n")
+    out.write("        case\n")
+    for cell, move_dir in legal:
+        out.write(f"            at = {cell} & move = {move_dir} : push_{cell}_{move_dir};\n")
+    out.write("            TRUE : FALSE;\n")
+    out.write("        esac;\n")
+
+    # Win condition, as in the box-bitmap cell model
+    out.write("    win := ")
+    if len(boxes) == len(goal_cells):
+        terms = [f"box[{cell}]" for cell in goal_cells]
+    else:
+        terms = [f"!box[{cell}]" for cell in range(len(compiled)) if cell not in goal_cells]
+    out.write(" & ".join(terms) or "TRUE")
+    out.write(";\n")
+    if prune_dead:
+        for cell in dead_cells(compiled, goals):
+            out.write(f"INVAR !box[{cell}];\n")
+    if invar_spec:
+        # Plain reachability for the invariant engines (no LTL loop-backs)
+        out.write("INVARSPEC !win;\n")
+    out.write("LTLSPEC !F win;\n")
@@ -0,0 +1,532 @@
+import array,collections,queue,re,subprocess,threading,time
+from nusmv_session import NUXMV, NuSMVSession, find_verdict, kill_process, run_measured, run_streaming
+from smv_models import MOVE_STEPS, compile_board, parse_board
+
+
+def nusmv_usage(output, usage=None):
+    # CPU seconds and memory MB of a run: the OS figures (user + sys time,
+    # peak RSS) when they were measured, else what nuXmv's stdout reports
+    cpu = None
+    mem = None
+    m = re.search(r"cpu time.*?([0-9]+\.[0-9]+)", output, re.IGNORECASE)
+    if m: cpu = float(m.group(1))
+    m = re.search(r"memory used.*?([0-9]+\.[0-9]+)\s*mb", output, re.IGNORECASE)
+    if m: mem = float(m.group(1))
+    if usage and usage["user"] is not None:
+        cpu = usage["user"] + usage["sys"]
+    if usage and usage["max_rss_mb"] is not None:
+        mem = usage["max_rss_mb"]
+    return cpu, mem
+
+
+# Result states: a solution was found, the board was proved dead, or
+# nothing was proved up to the bound
+SOLVED = "solved"
+PROVED_UNSOLVABLE = "proved_unsolvable"
+UNKNOWN = "unknown"
+
+
+def nusmv_status(output):
+    # "is false" comes with a counterexample, i.e. a solution. "is true" is
+    # only printed by the complete engines (BDD fixpoint, IC3, k-induction),
+    # so it is a proof; BMC's "no counterexample found with bound k" is not,
+    # and neither is "cannot prove the invariant ... is true or false" from
+    # an induction that failed. Only the verdict line itself counts.
+    verdict = find_verdict(output)
+    if verdict == "false":
+        return SOLVED
+    if verdict == "true":
+        return PROVED_UNSOLVABLE
+    return UNKNOWN
+
+
+# Invariant checkers for INVARSPEC !win, see generate_smv_model(invar_spec=True)
+INVAR_ENGINES = {
+    # Plain bounded search for a path to win of length <= bound. The default
+    # "classic" check_invar_bmc algorithm ignores -k and does a one-step
+    # induction, so the incremental one is told to only falsify.
+    "invar_bmc": ["build_boolean_model", "bmc_setup", "check_invar_bmc_inc -a falsification -k {bound}"],
+    # k-induction: proves !win once it is inductive within the bound
+    "invar_kind": ["build_boolean_model", "bmc_setup", "check_invar_bmc -a een-sorensson -k {bound}"],
+    "invar_ic3": ["build_boolean_model", "check_invar_ic3"],
+    # Forward BDD search stops at the first frontier that reaches win
+    "invar_bdd": ["build_model", "check_invar -s forward"],
+}
+
+
+class TraceSolution:
+    """A decoded counterexample: the LURD move string and the box cells.
+
+    Moves are lower case for walking and upper case for pushes. boxes holds
+    the CompiledBoard cells of every box for each trace state, back to back
+    in one array, so state k is boxes[k * num_boxes:(k + 1) * num_boxes].
+    """
+
+    OPPOSITE = {'r': 'l', 'l': 'r', 'u': 'd', 'd': 'u'}
+
+    def __init__(self, compiled, num_boxes):
+        self.compiled = compiled
+        self.num_boxes = num_boxes
+        self.moves = []
+        self.boxes = array.array('h')
+        self.man = None
+
+    def __len__(self):
+        return len(self.boxes) // self.num_boxes if self.num_boxes else 0
+
+    def __str__(self):
+        return "".join(self.moves)
+
+    def box_cells(self, step):
+        return self.boxes[step * self.num_boxes:(step + 1) * self.num_boxes]
+
+    def box_positions(self, step):
+        return [self.compiled.cells[cell] for cell in self.box_cells(step)]
+
+    def walk(self, start, end, blocked):
+        # Shortest player walk between two cells around the boxes
+        parent = {start: None}
+        queue = collections.deque([start])
+        while queue and end not in parent:
+            cell = queue.popleft()
+            for move_dir, _, _, _ in MOVE_STEPS:
+                nxt = self.compiled.neighbours[move_dir][cell]
+                if nxt >= 0 and nxt not in parent and nxt not in blocked:
+                    parent[nxt] = (cell, move_dir)
+                    queue.append(nxt)
+        if end not in parent:
+            raise ValueError(f"no walk from cell {start} to cell {end} in the trace")
+        path = []
+        while parent[end] is not None:
+            end, move_dir = parent[end]
+            path.append(move_dir)
+        return path[::-1]
+
+    def add(self, man, box_cells):
+        # Append the next trace state, filling in the moves that lead to it.
+        # One state is one step in the step and cell models but a whole
+        # walk plus push in the push-level model; both decode the same way.
+        if self.man is not None:
+            before = set(self.box_cells(len(self) - 1))
+            moved_from = before - set(box_cells)
+            if moved_from:
+                cell = moved_from.pop()
+                target = (set(box_cells) - before).pop()
+                push = next(d for d, _, _, _ in MOVE_STEPS if self.compiled.neighbours[d][cell] == target)
+                behind = self.compiled.neighbours[self.OPPOSITE[push]][cell]
+                self.moves += self.walk(self.man, behind, before)
+                self.moves.append(push.upper())
+            elif man != self.man:
+                self.moves += self.walk(self.man, man, before)
+        self.man = man
+        self.boxes.extend(box_cells)
+
+
+def parse_trace(output):
+    # States of the first counterexample in nuXmv output, as dicts of
+    # variable values. nuXmv prints only what changed from the previous
+    # state, so values are carried forward. Input blocks are skipped: the
+    # moves are recovered from the positions instead.
+    states = []
+    in_trace = False
+    in_input = False
+    for line in output.splitlines():
+        text = line.strip()
+        if not in_trace:
+            in_trace = "is false" in text
+            continue
+        if text.startswith("-> State:"):
+            states.append(dict(states[-1]) if states else {})
+            in_input = False
+        elif text.startswith("-> Input:"):
+            in_input = True
+        elif " = " in text and states:
+            if not in_input:
+                name, value = text.split(" = ", 1)
+                states[-1][name] = value
+        elif text and not text.startswith(("-- as demonstrated", "Trace ", "-- Loop")):
+            if states:
+                break
+    return states
+
+
+def decode_trace(output, board, target_box=None):
+    # Turn the counterexample of a "false" result into a TraceSolution, cut
+    # at the first state where the boxes are on the goals (the rest of the
+    # lasso is not part of the solution). Works for the coordinate, cell,
+    # box bitmap and push-level models. Returns None when there is no trace.
+    states = parse_trace(output)
+    if not states:
+        return None
+    sokoban_pos, boxes, goals, grid = parse_board(board)
+    compiled = compile_board(grid, sokoban_pos, boxes)
+    goal_cells = {compiled.cell(*goal) for goal in goals}
+    solution = TraceSolution(compiled, len(boxes))
+    for state in states:
+        if "man_c" in state:
+            man = compiled.cell(int(state["man_c"]), int(state["man_r"]))
+            box_cells = [compiled.cell(int(state[f"box_{i}_c"]), int(state[f"box_{i}_r"])) for i in range(1, len(boxes) + 1)]
+        elif "box[0]" in state:
+            man = int(state["man"])
+            box_cells = [cell for cell in range(len(compiled)) if state.get(f"box[{cell}]") == "TRUE"]
+        else:
+            man = int(state["man"])
+            box_cells = [int(state[f"box_{i}"]) for i in range(1, len(boxes) + 1)]
+        solution.add(man, box_cells)
+
+        if target_box is not None:
+            done = box_cells[target_box - 1] in goal_cells
+        elif len(box_cells) >= len(goal_cells):
+            done = goal_cells <= set(box_cells)
+        else:
+            done = set(box_cells) <= goal_cells
+        if done:
+            break
+    return solution
+
+
+def attach_solution(stats, board, target_box=None):
+    # Keep the decoded solution in the result instead of the raw stdout
+    if stats["status"] != SOLVED:
+        return stats
+    try:
+        solution = decode_trace(stats["stdout"], board, target_box)
+    except (KeyError, ValueError, StopIteration) as e:
+        print(f"Could not decode the counterexample: {e}")
+        return stats
+    if solution is not None:
+        stats.update({"solution": str(solution), "trace": solution, "stdout": None})
+        print(f"--> solution ({len(solution.moves)} moves): {solution}")
+    return stats
+
+
+def run_nusmv_and_check(filename,bound=20,engine='sat',pool=None,stream=False,board=None,target_box=None):
+    # Commands to run in NuSMV interactive mode
+    # SAT‐based bounded check of !F win up to 'bound'
+    run_cmd = f"check_ltlspec_bmc -k {bound}"
+
+    
+    steps = [
+        f"set engine {engine}", #switch to BDD or SAT
+        "set show_defines 0", # traces: changed VARs only, no DEFINEs
+        "read_model",
+        "flatten_hierarchy",
+        "encode_variables",
+        "build_boolean_model",
+        "bmc_setup",
+        run_cmd, 
+    ]
+    if engine in INVAR_ENGINES:
+        # Reachability of win through the invariant engines instead
+        steps = ["set show_defines 0", "read_model", "flatten_hierarchy", "encode_variables"]
+        steps += [cmd.format(bound=bound) for cmd in INVAR_ENGINES[engine]]
+        run_cmd = steps[-1]
+    commands = "\n".join(steps + ["quit"]) + "\n"
+
+
+    
+    try:
+        # Time the whole NuSMV invocation:
+        start = time.perf_counter()
+        if pool is not None:
+            # Reuse a running nuXmv session instead of starting a new process
+            output, error_output, usage = pool.run(filename, steps, timeout=60)
+            elapsed = time.perf_counter() - start
+        elif stream:
+            # Parse stdout as it arrives and stop nuXmv once the verdict and
+            # its trace are in, keeping only a compact log
+            output, error_output, usage = run_streaming([NUXMV, "-int", filename], commands, timeout=60)
+            elapsed = time.perf_counter() - start
+        else:
+            # Run NuSMV with the commands, measuring the child's CPU and memory
+            output, error_output, usage = run_measured(
+                [r"G:\My Drive\Asaf\Masters and PhD\PhD\Courses\Formal Verification and Synthesis - Hilel Kugler\nuXmv\bin\nuXmv.exe", "-int", filename],
+                commands,
+                timeout=60  # seconds
+            )
+            elapsed = time.perf_counter() - start
+
+
+        if error_output:
+            print("NuSMV error output:\n", error_output)
+
+        # Debug: show nuXmv’s verdict
+        print(f"\n--- nuXmv output for {filename} ---\n{output}")
+
+        # CPU & memory as measured by the OS, else from NuSMV’s stdout:
+        cpu, mem = nusmv_usage(output, usage)
+        
+        # Parse the result of check_ltlspec_bmc
+        #If spec is true we loose no winning condition exisits
+        #When spec is false we win 
+        status = nusmv_status(output)
+        if status == SOLVED:
+            print("\n LTL Specification FAILED (is false).")
+            winnable = True
+        
+        elif status == PROVED_UNSOLVABLE:
+            print("\n  Specification proved (is true): board is unsolvable")
+            winnable = False
+        else:
+            print("\n  Could not find counter example to fail LTL check")
+            winnable = False
+        # Return a summary dict
+        stats = {
+            "filename": filename,
+            "engine": engine,
+            "spec": run_cmd,
+            "winnable": winnable,
+            "status": status,
+            "bound": bound,
+            "elapsed": elapsed,
+            "cpu": cpu,
+            "mem": mem,
+            "user": usage["user"],
+            "sys": usage["sys"],
+            "max_rss_mb": usage["max_rss_mb"],
+            "stdout": output,
+            "stderr": error_output
+        }    
+        if board is not None:
+            attach_solution(stats, board, target_box)
+        return stats
+    
+    except FileNotFoundError:
+        print("Error: NuSMV executable not found. Make sure it is installed and in your PATH.")
+    except subprocess.TimeoutExpired:
+        print("Error: NuSMV process timed out.")
+    except subprocess.CalledProcessError as e:
+        print(f"Error: NuSMV session exited with code {e.returncode}.")
+
+
+# Progress line check_ltlspec_bmc_inc prints for each length it has cleared
+BMC_CLEARED = re.compile(r"^-- no counterexample found with bound (\d+)", re.MULTILINE)
+
+
+def run_bound_escalation(filename, ceiling=80, pool=None, timeout=60, prove=False, prove_timeout=None, board=None):
+    # Check !F win in one nuXmv session for every length up to `ceiling`. The
+    # model is read and encoded once, and a single check_ltlspec_bmc_inc run
+    # tries lengths 0..ceiling in order on one incremental SAT instance,
+    # stopping at the first counterexample: the solution found is the
+    # shortest one and no length is checked twice. `timeout` covers reading
+    # the model and that run; if it runs out, the result is "unknown" with
+    # the largest bound nuXmv reported clear before it was killed (-1 if
+    # none). With prove=True a board with no solution up to the ceiling gets
+    # a k-induction run (SBMC with its completeness check) to try to prove it
+    # dead, with its own `prove_timeout` (default: timeout), so the whole call
+    # can take up to timeout + prove_timeout. Returns a run_nusmv_and_check
+    # style dict with the bound it stopped at (the solution's length when one
+    # was found).
+    session = None
+    output, error_output = [], []
+    try:
+        start = time.perf_counter()
+        deadline = start + timeout
+        if pool is not None:
+            session = pool.acquire()
+        else:
+            session = NuSMVSession()
+            session.start()
+        mark = session.sampler.mark()
+        for cmd in ["set show_defines 0", f'read_model -i "{filename}"', "flatten_hierarchy", "encode_variables", "build_boolean_model", "bmc_setup"]:
+            out, err = session.command(cmd, timeout=max(deadline - time.perf_counter(), 0))
+            output.append(out)
+            error_output.append(err)
+
+        run_cmd = f"check_ltlspec_bmc_inc -k {ceiling}"
+        bound = ceiling
+        timed_out = False
+        try:
+            out, err = session.command(run_cmd, timeout=max(deadline - time.perf_counter(), 0))
+        except subprocess.TimeoutExpired as e:
+            # The session is gone; keep what it printed and report the
+            # largest length it got through
+            out, err = (e.output or b"").decode("utf-8", "replace"), ""
+            cleared = [int(k) for k in BMC_CLEARED.findall(out)]
+            bound = max(cleared, default=-1)
+            status = UNKNOWN
+            timed_out = True
+            print(f"--> timed out after {timeout}s: no solution up to bound {bound}")
+        else:
+            status = nusmv_status(out)
+            if status == SOLVED:
+                bound = max(len(parse_trace(out)) - 1, 0)
+            print(f"--> bound {bound}: {'solved' if status == SOLVED else 'no solution up to here'}")
+        output.append(out)
+        error_output.append(err)
+        if status == UNKNOWN and prove and session.alive():
+            run_cmd = f"check_ltlspec_sbmc_inc -c -k {bound}"
+            try:
+                out, err = session.command(run_cmd, timeout=prove_timeout or timeout)
+            except subprocess.TimeoutExpired as e:
+                out, err = (e.output or b"").decode("utf-8", "replace"), ""
+                print(f"--> k-induction timed out after {prove_timeout or timeout}s")
+            output.append(out)
+            error_output.append(err)
+            status = nusmv_status(out)
+        usage = session.sampler.since(mark)
+        if session.alive():
+            session.command("reset", timeout=timeout)
+            session.models += 1
+        elapsed = time.perf_counter() - start
+
+        output = "".join(output)
+        cpu, mem = nusmv_usage(output, usage)
+        stats = {
+            "filename": filename,
+            "engine": "sat",
+            "spec": run_cmd,
+            "winnable": status == SOLVED,
+            "status": status,
+            "bound": bound,
+            "timed_out": timed_out,
+            "elapsed": elapsed,
+            "cpu": cpu,
+            "mem": mem,
+            "user": usage["user"],
+            "sys": usage["sys"],
+            "max_rss_mb": usage["max_rss_mb"],
+            "stdout": output,
+            "stderr": "".join(error_output)
+        }
+        if board is not None:
+            attach_solution(stats, board)
+        return stats
+
+    except FileNotFoundError:
+        print("Error: NuSMV executable not found. Make sure it is installed and in your PATH.")
+    except subprocess.TimeoutExpired:
+        print("Error: NuSMV process timed out.")
+    except subprocess.CalledProcessError as e:
+        print(f"Error: NuSMV session exited with code {e.returncode}.")
+    finally:
+        if session is not None and pool is not None:
+            pool.release(session)
+        elif session is not None:
+            session.close()
+
+
+# Portfolio engines: nuXmv commands that build the model and check !F win.
+# "sat" can only prove winnability (a counterexample within the bound), the
+# others settle the property either way.
+PORTFOLIO_ENGINES = {
+    "sat": ["build_boolean_model", "bmc_setup", "check_ltlspec_bmc -k {bound}"],
+    "bdd": ["build_model", "check_ltlspec"],
+    "kind": ["build_boolean_model", "bmc_setup", "check_ltlspec_sbmc_inc -c -k {bound}"],
+    "ic3": ["build_boolean_model", "check_ltlspec_ic3"],
+}
+
+
+def run_portfolio(filename, bound=20, engines=("sat", "bdd", "kind", "ic3"), timeout=60, board=None):
+    # Race several engines on the same model and keep the first definitive
+    # answer; the rest are killed, so latency is the fastest engine's.
+    # Returns a run_nusmv_and_check style dict for the winning engine (or
+    # the last one to finish when none is definitive), None when every
+    # engine failed.
+    finished = queue.Queue()
+    procs = {}
+    lock = threading.Lock()
+    decided = threading.Event()
+
+    def race(engine):
+        commands = ["set show_defines 0", "read_model", "flatten_hierarchy", "encode_variables"]
+        commands += [cmd.format(bound=bound) for cmd in PORTFOLIO_ENGINES[engine]]
+
+        def register(proc):
+            with lock:
+                procs[engine] = proc
+                if decided.is_set():
+                    kill_process(proc)  # race already decided
+
+        result = (engine, None, None, None, None)
+        try:
+            if decided.is_set():
+                return
+            stdout, stderr, usage = run_measured([NUXMV, "-int", filename], "\n".join(commands + ["quit"]) + "\n",
+                                                 timeout=timeout, started=register)
+            result = (engine, commands[-1], stdout, stderr, usage)
+        except Exception as e:
+            print(f"Error: {engine} engine failed: {e}")
+        finally:
+            # run_measured has reaped it by now: nothing left to kill
+            with lock:
+                procs.pop(engine, None)
+            # Every engine reports, even a failed one, or the loop below
+            # would wait for it forever
+            finished.put(result)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=race, args=(engine,), daemon=True) for engine in engines]
+    for thread in threads:
+        thread.start()
+
+    best = None
+    verdicts = {}
+    # Each run is killed at `timeout`; the grace covers reaping it
+    deadline = start + timeout + 5
+    for _ in engines:
+        try:
+            engine, spec, output, error_output, usage = finished.get(timeout=max(deadline - time.perf_counter(), 0))
+        except queue.Empty:
+            print("Error: portfolio engines did not report in time")
+            break
+        if output is None:
+            continue
+        verdicts[engine] = nusmv_status(output)
+        best = (engine, spec, output, error_output, usage)
+        if verdicts[engine] != UNKNOWN:
+            break
+    elapsed = time.perf_counter() - start
+
+    # First answer wins: stop everything still running
+    with lock:
+        decided.set()
+        for proc in procs.values():
+            if proc.returncode is None:
+                kill_process(proc)
+    if best is None:
+        return None
+
+    engine, spec, output, error_output, usage = best
+    cpu, mem = nusmv_usage(output, usage)
+    print(f"--> portfolio: {engine} answered first in {elapsed:.2f}s")
+    stats = {
+        "filename": filename,
+        "engine": engine,
+        "spec": spec,
+        "winnable": verdicts[engine] == SOLVED,
+        "status": verdicts[engine],
+        "bound": bound,
+        "verdicts": verdicts,
+        "elapsed": elapsed,
+        "cpu": cpu,
+        "mem": mem,
+        "user": usage["user"],
+        "sys": usage["sys"],
+        "max_rss_mb": usage["max_rss_mb"],
+        "stdout": output,
+        "stderr": error_output
+    }
+    if board is not None:
+        attach_solution(stats, board)
+    return stats
+
+
+# Push states the native pre-filter may visit before deferring to nuXmv
+NATIVE_PREFILTER_NODES = 20_000
+
+
+def cached_run(cache, board, options, engine, bound, run):
+    # Look the run up in the result cache (if any) before spawning a solver,
+    # and remember fresh results. Failed runs (None) and runs cut short by
+    # their time budget are not cached.
+    if cache is None:
+        return run()
+    stats = cache.get(board, options, engine, bound)
+    if stats is not None:
+        print(f"--> cached {engine} result (bound={bound})")
+        return stats
+    stats = run()
+    if stats is not None and not stats.get("timed_out"):
+        cache.put(board, options, engine, bound, stats)
+    return stats
@@ -0,0 +1,123 @@
+from main_rev6_with_nusmv_automation import parse_board
+from native_solver import SOLVED, DeadlockDetector, Level, TranspositionTable, solve_astar, solve_bfs, solve_idastar
+
+
+def pushes(stats):
+    return sum(move.isupper() for move in stats["solution"])
+
+
+def test_matching_heuristic_keeps_astar_and_idastar_optimal():
+    # A stale goal dual used to drive the incremental bound below 0, so both
+    # searches accepted a 7-push solution where BFS finds 6
+    board = [
+        "########",
+        "# ..   #",
+        "# #$   #",
+        "# $ @  #",
+        "# #   .#",
+        "########",
+    ]
+    bfs = solve_bfs(*parse_board(board))
+    assert bfs["status"] == SOLVED
+    for solve in (solve_astar, solve_idastar):
+        stats = solve(*parse_board(board))
+        assert stats["status"] == SOLVED
+        assert pushes(stats) == pushes(bfs) == 6
+
+
+def start_state(board):
+    level = Level(*parse_board(board))
+    state = level.pack(level.box_mask, level.normalise(level.player, level.box_mask))
+    return level, DeadlockDetector(level), state
+
+
+def test_freeze_deadlock_two_boxes_against_a_wall():
+    # Neither box can leave the wall or slide along it, and they are off goals
+    level, detector, state = start_state([
+        "########",
+        "#.  $$.#",
+        "#      #",
+        "#@     #",
+        "########",
+    ])
+    assert detector.deadlocked(state, level.box_cells(level.box_mask)[0])
+    assert detector.frozen == 1 and detector.corrals == 0
+
+
+def test_frozen_boxes_on_goals_are_not_pruned():
+    level, detector, state = start_state([
+        "########",
+        "#   ** #",
+        "#      #",
+        "#@     #",
+        "########",
+    ])
+    assert not any(detector.deadlocked(state, box) for box in level.box_cells(level.box_mask))
+
+
+def test_corral_deadlock_player_locked_out():
+    # The right-hand box fences off the right area, every push the player
+    # can make goes into it, and that box alone never reaches a goal
+    board = [
+        "#######",
+        "#  #  #",
+        "#$ @$ #",
+        "#  #. #",
+        "#.#   #",
+        "#######",
+    ]
+    level, detector, state = start_state(board)
+    assert detector.deadlocked(state, level.box_cells(level.box_mask)[0])
+    assert detector.frozen == 0 and detector.corrals == 1
+    assert solve_bfs(*parse_board(board))["status"] != SOLVED
+
+
+def test_corral_with_the_player_inside_is_not_pruned():
+    board = [
+        "#######",
+        "#  #  #",
+        "#$  $@#",
+        "#  #. #",
+        "#.#   #",
+        "#######",
+    ]
+    level, detector, state = start_state(board)
+    assert not any(detector.deadlocked(state, box) for box in level.box_cells(level.box_mask))
+    assert solve_bfs(*parse_board(board))["status"] == SOLVED
+
+
+def test_transposition_table_replaces_the_deepest_entry_when_full():
+    table = TranspositionTable(max_bytes=0)
+    capacity = table.mask + 1
+    # PROBE keys on the same home slot fill the whole probe window
+    keys = [capacity * i + 3 for i in range(1, table.PROBE + 1)]
+    for depth, key in enumerate(keys, 1):
+        assert table.visit(key, depth)
+    assert table.used == table.PROBE
+    # Known states are cut at the same or a greater depth only
+    assert not table.visit(keys[0], 1) and not table.visit(keys[0], 5)
+    assert table.visit(keys[4], 2)
+
+    # Full window: the deepest entry (keys[-1], depth PROBE) makes room
+    newcomer = capacity * (table.PROBE + 1) + 3
+    assert table.visit(newcomer, 3)
+    assert table.replaced == 1
+    assert not table.visit(newcomer, 3)
+    # The evicted state is new again, but nothing in the window is deeper
+    # than it any more, so it is searched without being stored
+    assert table.visit(keys[-1], table.PROBE)
+    assert table.dropped == 1 and table.replaced == 1
+    assert table.visit(keys[-1], table.PROBE)
+
+
+def test_transposition_table_old_generation_is_replaced_first():
+    table = TranspositionTable(max_bytes=0)
+    capacity = table.mask + 1
+    keys = [capacity * i + 3 for i in range(1, table.PROBE + 1)]
+    for key in keys:
+        table.visit(key, 1)
+    table.new_generation()
+    # Stale entries no longer cut anything, and give way to new ones
+    assert table.visit(keys[0], 1)
+    assert table.visit(capacity * (table.PROBE + 1) + 3, 20)
+    assert table.replaced == 1 and table.dropped == 0
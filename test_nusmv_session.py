@@ -0,0 +1,40 @@
+from nusmv_session import VerdictReader, find_verdict
+from smv_runner import PROVED_UNSOLVABLE, SOLVED, UNKNOWN, nusmv_status
+
+
+def test_find_verdict_behind_prompts():
+    assert find_verdict("nuXmv > -- invariant !win  is true\n") == "true"
+    assert find_verdict("nuXmv > nuXmv > -- specification !(F win)  is false\n") == "false"
+
+
+def test_bmc_progress_and_failed_induction_are_not_verdicts():
+    output = ("-- no counterexample found with bound 0\n"
+              "-- no counterexample found with bound 1\n"
+              "-- cannot prove the invariant !win : the induction fails\n"
+              "-- cannot prove the invariant !win  is true or false\n")
+    assert find_verdict(output) is None
+    assert nusmv_status(output) == UNKNOWN
+    assert nusmv_status("-- no counterexample found with bound 5\n-- invariant !win  is true\n") == PROVED_UNSOLVABLE
+
+
+def test_verdict_reader_stops_at_prompt_prefixed_verdict():
+    reader = VerdictReader()
+    assert not reader.feed("-- no counterexample found with bound 3\n")
+    assert reader.feed("nuXmv > -- invariant !win  is true\n")
+    assert reader.verdict == "is true"
+
+
+def test_verdict_reader_waits_for_the_trace():
+    reader = VerdictReader()
+    lines = ["-- specification !(F win)  is false\n",
+             "-- as demonstrated by the following execution sequence\n",
+             "Trace Type: Counterexample \n",
+             "  -> State: 1.1 <-\n",
+             "    man = 1\n",
+             "  -> State: 1.2 <-\n",
+             "    man = 2\n"]
+    assert not any(reader.feed(line) for line in lines)
+    assert reader.feed("nuXmv > ")
+    assert reader.verdict == "is false"
+    assert nusmv_status(reader.output()) == SOLVED
+    assert "man = 2" in reader.output()
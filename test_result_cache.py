@@ -0,0 +1,49 @@
+import os
+
+from result_cache import ResultCache
+from smv_runner import TraceSolution
+
+
+BOARD = ["#####", "#@$.#", "#####"]
+
+
+def test_key_ignores_trailing_blanks_but_not_leading_ones(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    key = cache.key(BOARD, {"cell_index": True}, "sat", 20)
+    assert cache.key([row + "  " for row in BOARD] + ["", "   "], {"cell_index": True}, "sat", 20) == key
+    assert cache.key([" " + row for row in BOARD], {"cell_index": True}, "sat", 20) != key
+    assert cache.key(BOARD, None, "sat", 20) == cache.key(BOARD, {}, "sat", 20)
+    assert cache.key(BOARD, {"cell_index": True}, "bdd", 20) != key
+    assert cache.key(BOARD, {"cell_index": True}, "sat", 30) != key
+
+
+def test_round_trip_drops_solver_output(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    trace = TraceSolution(None, 1)
+    trace.boxes.extend([2, 3])
+    stats = {"status": "solved", "bound": 1, "solution": "R",
+             "stdout": "-- specification !(F win)  is false", "stderr": "warning", "trace": trace}
+    assert cache.get(BOARD, None, "sat", 20) is None
+    cache.put(BOARD, None, "sat", 20, stats)
+    hit = cache.get(BOARD, None, "sat", 20)
+    assert hit == {"status": "solved", "bound": 1, "solution": "R", "trace_boxes": [2, 3], "cached": True}
+
+
+def test_evict_drops_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    for bound in (10, 20, 30):
+        cache.put(BOARD, None, "sat", bound, {"status": "unknown", "bound": bound})
+    paths = {bound: cache.path(cache.key(BOARD, None, "sat", bound)) for bound in (10, 20, 30)}
+    # Oldest first: 10, then 30, then 20
+    for age, bound in enumerate((10, 30, 20)):
+        os.utime(paths[bound], (1000 + age, 1000 + age))
+    cache.max_bytes = os.path.getsize(paths[20]) + os.path.getsize(paths[30])
+    cache._evict()
+    assert not os.path.exists(paths[10])
+    assert os.path.exists(paths[20]) and os.path.exists(paths[30])
+    # A hit counts as a use: 30 is now the newest, so 20 goes next
+    assert cache.get(BOARD, None, "sat", 30)["bound"] == 30
+    cache.max_bytes = os.path.getsize(paths[30])
+    cache._evict()
+    assert not os.path.exists(paths[20])
+    assert os.path.exists(paths[30])
@@ -0,0 +1,74 @@
+from smv_models import compile_board, parse_board
+from smv_runner import decode_trace, parse_trace
+
+
+# The player walks up to the box, then pushes it twice to the right: uRR
+BOARD = [
+    "######",
+    "# $ .#",
+    "#@   #",
+    "######",
+]
+
+HEADER = ("-- specification !(F win)  is false\n"
+          "-- as demonstrated by the following execution sequence\n"
+          "Trace Description: BMC Counterexample \n"
+          "Trace Type: Counterexample \n")
+
+
+def cell(col, row):
+    sokoban_pos, boxes, goals, grid = parse_board(BOARD)
+    return compile_board(grid, sokoban_pos, boxes).cell(col, row)
+
+
+def test_parse_trace_carries_unchanged_values_forward():
+    output = HEADER + ("  -> State: 1.1 <-\n"
+                       "    man_c = 2\n"
+                       "    man_r = 3\n"
+                       "  -> Input: 1.2 <-\n"
+                       "    move = u\n"
+                       "  -> State: 1.2 <-\n"
+                       "    man_r = 2\n"
+                       "nuXmv > ")
+    assert parse_trace(output) == [{"man_c": "2", "man_r": "3"}, {"man_c": "2", "man_r": "2"}]
+
+
+def test_decode_step_trace_to_lurd():
+    # One state per step, cut where the box reaches the goal
+    output = HEADER + ("  -- Loop starts here\n"
+                       "  -> State: 1.1 <-\n"
+                       "    man_c = 2\n"
+                       "    man_r = 3\n"
+                       "    box_1_c = 3\n"
+                       "    box_1_r = 2\n"
+                       "  -> State: 1.2 <-\n"
+                       "    man_r = 2\n"
+                       "  -> State: 1.3 <-\n"
+                       "    man_c = 3\n"
+                       "    box_1_c = 4\n"
+                       "  -> State: 1.4 <-\n"
+                       "    man_c = 4\n"
+                       "    box_1_c = 5\n"
+                       "  -> State: 1.5 <-\n"
+                       "    man_c = 3\n")
+    solution = decode_trace(output, BOARD)
+    assert str(solution) == "uRR"
+    assert solution.box_positions(len(solution) - 1) == [(5, 2)]
+
+
+def test_decode_push_level_trace_fills_in_the_walk():
+    # The push-level model jumps straight from push to push
+    output = HEADER + ("  -> State: 1.1 <-\n"
+                       f"    man = {cell(2, 3)}\n"
+                       f"    box_1 = {cell(3, 2)}\n"
+                       "  -> State: 1.2 <-\n"
+                       f"    man = {cell(3, 2)}\n"
+                       f"    box_1 = {cell(4, 2)}\n"
+                       "  -> State: 1.3 <-\n"
+                       f"    man = {cell(4, 2)}\n"
+                       f"    box_1 = {cell(5, 2)}\n")
+    assert str(decode_trace(output, BOARD)) == "uRR"
+
+
+def test_no_trace_without_a_false_verdict():
+    assert decode_trace("-- specification !(F win)  is true\n", BOARD) is None